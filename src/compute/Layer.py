@@ -8,12 +8,14 @@ from typing import Tuple, List
 from time import time
 
 import jsonschema
+import numpy as np
 
-from supervisely import ProjectMeta, TagMeta, ObjClass, Annotation, rand_str
-from src.compute.dtl_utils.item_descriptor import ImageDescriptor
+from supervisely import ProjectMeta, TagMeta, ObjClass, Annotation, VideoAnnotation, rand_str
+from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
 from src.compute.utils import json_utils
 from src.compute.utils import os_utils
 from src.compute.utils.stat_timer import TinyTimer, global_timer
+from src.compute.utils.executors import process_items_parallel
 from supervisely.sly_logger import logger
 from supervisely.annotation.json_geometries_map import GET_GEOMETRY_FROM_STR
 from supervisely.imaging.color import hex2rgb
@@ -21,6 +23,7 @@ from supervisely.imaging.color import hex2rgb
 from src.compute.classes_utils import ClassConstants
 from src.compute.tags_utils import TagConstants
 from src.exceptions import CustomException, GraphError, CreateMetaError
+import src.globals as g
 
 
 def maybe_wrap_in_list(v):
@@ -90,6 +93,11 @@ class Layer:
 
     actions_mapping = {}
 
+    # Opt-in parallel execution of process() over the items of a batch (layers without batch processing).
+    # "thread" - for layers which don't draw from global random state (cv2/numpy release the GIL),
+    # "process" - for random or pure-python layers, every item is processed with its own seed.
+    executor_type = None
+
     def __init__(self, config, net=None):
         self._config = deepcopy(config)
         self.net = net
@@ -596,9 +604,46 @@ class Layer:
     def has_batch_processing(self) -> bool:
         return False
 
+    def get_random_state(self, item_desc: ImageDescriptor):
+        # layers draw random params from the state of the item, e.g. the same one for all frames
+        # of a video, or from the global state
+        if item_desc.random_state is not None:
+            return item_desc.random_state
+        return np.random
+
+    def process_video_frames(self, data_el: Tuple[VideoDescriptor, VideoAnnotation], new_ann=None):
+        """
+        Applies process() to every frame of the video as to an image item. Frames are processed
+        when the video file is read (e.g. by save layers), so the frames of several layers are
+        encoded once. new_ann is the output annotation, the input one by default.
+        """
+        vid_desc, ann = data_el
+        seed = int(np.random.randint(0, 2**31 - 1))
+        new_vid_desc = vid_desc.add_frame_layer(self, ann, seed)
+        return new_vid_desc, ann if new_ann is None else new_ann
+
     def postprocess(self):
         pass
 
+    def cancel(self):
+        # called instead of postprocess() when the pipeline is stopped or failed
+        pass
+
+    def __getstate__(self):
+        # net and ui callbacks stay in the main process when layer is sent to a worker process
+        state = self.__dict__.copy()
+        state["net"] = None
+        state["postprocess_cb"] = None
+        return state
+
+    def use_executor(self, data_batch) -> bool:
+        if self.executor_type is None or g.LAYER_WORKERS < 2 or len(data_batch) < 2:
+            return False
+        if self.net is not None and (self.net.preview_mode or self.net.in_worker):
+            # worker processes of the parallel execution mode already load all cores
+            return False
+        return True
+
     def process_timed(self, data_batch: List[Tuple[ImageDescriptor, Annotation]]):
         tm = TinyTimer()
         if self.has_batch_processing():
@@ -608,28 +653,33 @@ class Layer:
                         "action_name": self.__class__.action,
                         "id": id(self),
                         "items_count": len(data_batch),
+                        "items_out": len(layer_outputs),
                     },
                     tm.get_sec(),
                 )
-                tm = TinyTimer()
                 yield layer_outputs
+                tm = TinyTimer()  # do not count time spent in the next layers
         else:
             layer_outputs = []
             # logger.debug(
             #     f"'{self.__class__.action}' doesn't have batch processing. Items will be processed 1 by 1."
             # )
-            for data_el, ann in data_batch:
-                for layer_output in self.process((data_el, ann)):
-                    layer_outputs.append(layer_output)
+            if self.use_executor(data_batch):
+                for item_outputs in process_items_parallel(self, data_batch):
+                    layer_outputs.extend(item_outputs)
+            else:
+                for data_el, ann in data_batch:
+                    for layer_output in self.process((data_el, ann)):
+                        layer_outputs.append(layer_output)
             global_timer.add_value(
                 {
                     "action_name": self.__class__.action,
                     "id": id(self),
                     "items_count": len(data_batch),
+                    "items_out": len(layer_outputs),
                 },
                 tm.get_sec(),
             )
-            tm = TinyTimer()
             yield layer_outputs
 
     @staticmethod
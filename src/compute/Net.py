@@ -2,6 +2,8 @@
 
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from time import time
 
 import numpy as np
@@ -10,6 +12,10 @@ import src.globals as g
 from src.compute import layers  # to register layers
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
 from src.compute.Layer import Layer
+from src.compute.utils.disk_cache import download_ann_jsons, download_image_np
+from src.compute.utils.prefetch import prefetch_batches
+from src.compute.utils.stat_timer import TinyTimer, global_timer
+from src.compute.utils.video_prefetch import download_video, prefetch_videos
 from src.exceptions import (
     ActionNotFoundError,
     BadSettingsError,
@@ -42,6 +48,8 @@ class Net:
     def __init__(self, graph_desc, output_folder, modality):
         self.layers = []
         self.preview_mode = False
+        self.in_worker = False  # True in worker processes of the parallel execution mode
+        self.save_inputs = None  # batches reaching save layers are collected here if not None
         self.modality = modality
         self.total_elements_cnt = None
 
@@ -75,6 +83,7 @@ class Net:
                 raise NotImplementedError()
             self.layers.append(layer)
 
+        self.routing_table = None
         self.flat_out_names = False  # @TODO: move out
         self.annot_archive = None
         self.reset_existing_names()
@@ -140,14 +149,51 @@ class Net:
         for layer in self.layers:
             layer.postprocess()
 
+    def cancel(self):
+        for layer in self.layers:
+            try:
+                layer.cancel()
+            except Exception as e:
+                logger.warn(f"Failed to cancel layer '{layer.action}': {e}", exc_info=True)
+
     def may_require_items(self):
         for l in self.layers:
             if l.requires_item():
                 return True
         return False
 
+    def may_filter_items(self):
+        # True if some items may not reach a layer that reads pixels:
+        # a layer not reading pixels splits items by branches or drops some of them
+        if self.routing_table is None:
+            self.compile_routing()
+        for indx, layer in enumerate(self.layers):
+            if layer.type != "processing" or layer.requires_item():
+                continue
+            if len(layer.dsts) > 1:
+                return True
+            if any(
+                len(self.routing_table[(indx, branch)]) == 0 for branch in range(len(layer.dsts))
+            ):
+                return True
+        return False
+
+    def load_items(self, data_batch):
+        # downloads source images of the items that were not loaded yet
+        not_loaded = [
+            img_desc
+            for img_desc, _ in data_batch
+            if isinstance(img_desc, ImageDescriptor) and not img_desc.is_loaded()
+        ]
+        if len(not_loaded) == 0:
+            return
+        workers = max(1, min(g.DOWNLOAD_WORKERS, len(not_loaded)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(ImageDescriptor.read_image, not_loaded))
+
     def check_connections(self, indx=-1):
         if indx == -1:
+            self.compile_routing()
             for i in range(len(self.layers)):
                 if self.layers[i].type == "data":
                     for layer_ in self.layers:
@@ -161,10 +207,60 @@ class Net:
             if color == "visited":
                 return
             self.layers[indx].color = "visiting"
+            self.check_class_mappings(indx)
             for next_layer_indx in self.get_next_layer_indxs(indx):
                 self.check_connections(next_layer_indx)
             self.layers[indx].color = "visited"
 
+    def check_class_mappings(self, indx):
+        if hasattr(self.layers[indx], "src_check_mappings"):
+            for cls in self.layers[indx].src_check_mappings:
+                self.src_check_mappings.append((indx, cls))
+        if hasattr(self.layers[indx], "dst_check_mappings"):
+            for i, cls in self.src_check_mappings:
+                for l_name, l in self.layers[indx].dst_check_mappings.items():
+                    if cls not in l:
+                        raise RuntimeError(
+                            'No mapping for class "{}" declared in layer "{}" in "{}" mapping in layer "{}"'.format(
+                                cls,
+                                self.layers[i].description(),
+                                l_name,
+                                self.layers[indx].description(),
+                            )
+                        )
+
+    def compile_routing(self):
+        # routing table: (layer index, branch) -> indexes of layers consuming that output.
+        # branch -1 stands for all outputs of the layer
+        consumers = {}
+        for i, layer_ in enumerate(self.layers):
+            for src in layer_.srcs:
+                if isinstance(src, dict):
+                    layer_sources = [v for k in src for v in src[k]]
+                else:
+                    layer_sources = [src]
+                for layer_source in layer_sources:
+                    dst_consumers = consumers.setdefault(layer_source, [])
+                    if i not in dst_consumers:
+                        dst_consumers.append(i)
+
+        def get_consumers(dsts):
+            result = []
+            for dst in dict.fromkeys(dsts):
+                if dst == Layer.null:
+                    continue
+                result.extend(consumers.get(dst, []))
+            return result
+
+        self.routing_table = {}
+        for indx, layer in enumerate(self.layers):
+            if layer.type == "save":
+                self.routing_table[(indx, -1)] = []
+                continue
+            for branch, dst in enumerate(layer.dsts):
+                self.routing_table[(indx, branch)] = get_consumers([dst])
+            self.routing_table[(indx, -1)] = get_consumers(layer.dsts)
+
     def get_next_layer_indxs(self, indx, branch=-1, layers_idx_whitelist=None):
         #:param indx:
         #:param branch: specify when calling while processing images, do not specify when calling before processing images
@@ -172,47 +268,20 @@ class Net:
 
         if indx >= len(self.layers):
             raise RuntimeError("Invalid layer index.")
-        if branch == -1:  # check class mappings
-            if hasattr(self.layers[indx], "src_check_mappings"):
-                for cls in self.layers[indx].src_check_mappings:
-                    self.src_check_mappings.append((indx, cls))
-            if hasattr(self.layers[indx], "dst_check_mappings"):
-                for i, cls in self.src_check_mappings:
-                    for l_name, l in self.layers[indx].dst_check_mappings.items():
-                        if cls not in l:
-                            raise RuntimeError(
-                                'No mapping for class "{}" declared in layer "{}" in "{}" mapping in layer "{}"'.format(
-                                    cls,
-                                    self.layers[i].description(),
-                                    l_name,
-                                    self.layers[indx].description(),
-                                )
-                            )
+        if self.routing_table is None:
+            self.compile_routing()
 
         if self.layers[indx].type == "save":
             return []
 
-        if branch == -1:
-            dsts = self.layers[indx].dsts
-        else:
+        if branch != -1:
             if isinstance(branch, tuple):
                 branch = branch[-1]
-            dsts = [self.layers[indx].dsts[branch]]
-        dsts = list(set(dsts) - {Layer.null})
-
-        result = []
-        for dst in dsts:
-            for i, layer_ in enumerate(self.layers):
-                layer_sources = []
-                for src in layer_.srcs:
-                    if isinstance(src, dict):
-                        for k in src:
-                            layer_sources.extend(src[k])
-                    else:
-                        layer_sources.append(src)
-                if dst in layer_sources:
-                    if layers_idx_whitelist is None or i in layers_idx_whitelist:
-                        result.append(i)
+            if branch < 0:
+                branch += len(self.layers[indx].dsts)
+        result = self.routing_table[(indx, branch)]
+        if layers_idx_whitelist is not None:
+            result = [i for i in result if i in layers_idx_whitelist]
         return result
 
     def reset_existing_names(self):
@@ -300,8 +369,29 @@ class Net:
             ):
                 yield x
 
+    def process_until_save(self, data_batch):
+        # runs processing layers only, returns (save layer index, data batch) pairs
+        self.save_inputs = []
+        try:
+            for _ in self.start(data_batch):
+                pass
+            return self.save_inputs
+        finally:
+            self.save_inputs = None
+
+    def start_save(self, save_inputs):
+        # runs save layers on the batches returned by process_until_save
+        for indx, data_batch in save_inputs:
+            for output in self.process(indx, data_batch):
+                yield output
+
     def process(self, indx, data_batch, layers_idx_whitelist=None):
         layer: Layer = self.layers[indx]
+        if self.save_inputs is not None and layer.type == "save":
+            self.save_inputs.append((indx, data_batch))
+            return
+        if layer.requires_item():
+            self.load_items(data_batch)
         for layer_output in layer.process_timed(data_batch):
             if layer_output is None or len(layer_output) == 0:
                 raise RuntimeError("Layer_output ({}) is None.".format(layer))
@@ -428,7 +518,7 @@ class Net:
                                 (img_info.height, img_info.width, 3), dtype=np.uint8
                             )
                             if require_items:
-                                img_data = g.api.image.download_np(img_info.id)
+                                img_data = download_image_np(img_info)
                             item_idx += 1
                             img_desc = ImageDescriptor(
                                 LegacyProjectItem(
@@ -446,7 +536,7 @@ class Net:
                             )
                             img_desc.update_item(img_data)
                             ann = Annotation.from_json(
-                                g.api.annotation.download(img_info.id).annotation, project_meta
+                                download_ann_jsons(dataset_id, [img_info])[0], project_meta
                             )
                             data_el = (img_desc, ann)
                             yield data_el
@@ -472,9 +562,10 @@ class Net:
                                 False,
                             )
 
-                            video_path = os.path.join(g.DATA_DIR, vid_info.name)
-                            g.api.video.download_path(vid_info.id, video_path)
-                            vid_desc.update_item(video_path)
+                            if require_items:
+                                vid_desc.update_item(download_video(vid_info))
+                            else:
+                                vid_desc.set_item_loader(partial(download_video, vid_info))
                             ann_json = g.api.video.annotation.download(vid_info.id)
                             ann = VideoAnnotation.from_json(
                                 ann_json,
@@ -486,6 +577,8 @@ class Net:
 
     def get_elements_generator_batched(self, batch_size):
         require_items = self.may_require_items()
+        # when items may be filtered out before pixel layers, images are downloaded on demand
+        lazy_items = require_items and self.may_filter_items()
         data_layers_idxs = [idx for idx, layer in enumerate(self.layers) if layer.type == "data"]
         project_datasets = {}
         added = set()
@@ -522,27 +615,31 @@ class Net:
                             for item_info in images_list
                             if item_info.id in g.FILTERED_ENTITIES
                         ]
-                        images_ids = [item_info.id for item_info in images_list]
-                        annotations = []
-                        for batch_ids in batched(images_ids, batch_size):
-                            filters = [{"field": "imageId", "operator": "in", "value": batch_ids}]
-                            ann_batch = g.api.annotation.get_list(
-                                dataset_id=dataset_id, filters=filters
-                            )
-                            ann_ids = [ann.image_id for ann in ann_batch]
-                            ann_batch = g.api.annotation.download_batch(dataset_id, ann_ids)
-                            annotations.extend(ann_batch)
-                    else:
-                        images_ids = [item_info.id for item_info in images_list]
-                        annotations = g.api.annotation.download_batch(dataset_id, images_ids)
-
-                    for batch, ann_batch in zip(
-                        batched(images_list, batch_size), batched(annotations, batch_size)
+                    annotations = download_ann_jsons(dataset_id, images_list, batch_size)
+
+                    def _download_image(item_infos):
+                        img_info, _ = item_infos
+                        if not require_items or lazy_items:
+                            return None
+                        return download_image_np(img_info)
+
+                    items_infos_batches = (
+                        list(zip(batch, ann_batch))
+                        for batch, ann_batch in zip(
+                            batched(images_list, batch_size), batched(annotations, batch_size)
+                        )
+                    )
+                    for batch, imgs_data in prefetch_batches(
+                        items_infos_batches,
+                        _download_image,
+                        workers=g.DOWNLOAD_WORKERS,
+                        depth=g.PREFETCH_BATCHES,
                     ):
                         start_items_batch_time = time()
+                        parsing_sec = 0
 
                         items_batch = []
-                        for img_info, ann_info in zip(batch, ann_batch):
+                        for (img_info, ann_json), img_data in zip(batch, imgs_data):
                             item_idx += 1
                             img_desc = ImageDescriptor(
                                 LegacyProjectItem(
@@ -559,30 +656,44 @@ class Net:
                                 False,
                             )
 
-                            # img_data = np.zeros(
-                            #     (img_info.height, img_info.width, 3), dtype=np.uint8
-                            # )
-
-                            if require_items:
-                                img_data = g.api.image.download_np(img_info.id)
+                            if img_data is not None:
                                 img_desc.update_item(img_data)
+                            elif lazy_items:
+                                img_desc.set_item_loader(partial(download_image_np, img_info))
 
                             # if require_ann:
-                            ann = Annotation.from_json(ann_info.annotation, project_meta)
+                            tm = TinyTimer()
+                            ann = Annotation.from_json(ann_json, project_meta)
+                            parsing_sec += tm.get_sec()
                             data_el = (img_desc, ann)
                             items_batch.append(data_el)
                         end_items_batch_time = time()
+                        global_timer.add_io(
+                            "annotation_parsing", parsing_sec, items_count=len(items_batch)
+                        )
                         logger.debug(
                             f"Items Batch created in: '{end_items_batch_time - start_items_batch_time}' seconds"
                         )
                         yield items_batch
 
                 elif self.modality == "videos":
-                    for batch in g.api.video.get_list_generator(
-                        dataset_id=dataset_id, batch_size=batch_size
+                    video_infos = (
+                        vid_info
+                        for batch in g.api.video.get_list_generator(
+                            dataset_id=dataset_id, batch_size=batch_size
+                        )
+                        for vid_info in batch
+                    )
+                    for batch in prefetch_videos(
+                        video_infos,
+                        batch_size,
+                        download_files=require_items and not lazy_items,
+                        workers=g.DOWNLOAD_WORKERS,
+                        depth=g.VIDEO_PREFETCH,
+                        max_bytes=int(g.VIDEO_DISK_BUDGET_GB * 1024**3),
                     ):
                         items_batch = []
-                        for vid_info in batch:
+                        for vid_info, video_path, ann_json in batch:
                             item_idx += 1
                             vid_ext = get_file_ext(vid_info.name)
                             vid_desc = VideoDescriptor(
@@ -600,15 +711,18 @@ class Net:
                                 False,
                             )
 
-                            video_path = os.path.join(g.DATA_DIR, vid_info.name)
-                            g.api.video.download_path(vid_info.id, video_path)
-                            vid_desc.update_item(video_path)
-                            ann_json = g.api.video.annotation.download(vid_info.id)
+                            if video_path is not None:
+                                vid_desc.update_item(video_path)
+                            else:
+                                # pipelines not reading video files save them by id
+                                vid_desc.set_item_loader(partial(download_video, vid_info))
+                            tm = TinyTimer()
                             ann = VideoAnnotation.from_json(
                                 ann_json,
                                 project_meta,
                                 KeyIdMap(),
                             )
+                            global_timer.add_io("annotation_parsing", tm.get_sec(), items_count=1)
                             data_el = (vid_desc, ann)
                             items_batch.append(data_el)
                         yield items_batch
@@ -1,28 +1,67 @@
 # coding: utf-8
 
+import os
+from typing import Any, Callable, Dict, Generator, List
+
+from supervisely import Annotation, Label, VideoAnnotation, logger, rand_str
+from supervisely.io.fs import silent_remove
+
+import src.globals as g
 from src.utils import LegacyProjectItem
 import cv2
 import numpy as np
 
 from src.compute.utils.os_utils import ensure_base_path
-
+from src.compute.utils.stat_timer import TinyTimer
+from src.compute.utils.video_split import VideoEncoder
 
 class ItemDescriptor:
 
     def __init__(self, info: LegacyProjectItem, item_idx: int, modify_ds_name: bool = True):
         self.info = info
-        self.item_data = None  # can be changed in comp graph
+        self._item_data = None  # can be changed in comp graph
+        self._item_loader = None  # loads source item data on first access
+        self.item_modified = False  # True when item data differs from the source item
         self.item_idx = item_idx
+        # np.random.RandomState for random params of the layers, the global one if None
+        self.random_state = None
         if modify_ds_name:
             self.res_ds_name = "{}__{}".format(self.info.project_name, self.info.ds_name)
         else:
             self.res_ds_name = self.info.ds_name
 
+    @property
+    def item_data(self):
+        if self._item_data is None and self._item_loader is not None:
+            self._item_data = self._item_loader()
+            self._item_loader = None
+        return self._item_data
+
+    @item_data.setter
+    def item_data(self, item):
+        self._item_data = item
+        self.item_modified = True
+
     def read_item(self) -> None:
         raise NotImplementedError
 
     def update_item(self, item) -> None:
-        self.item_data = item
+        # sets source item data, e.g. downloaded from the server
+        self._item_data = item
+        self._item_loader = None
+
+    def set_item_loader(self, loader: Callable[[], Any]) -> None:
+        # source item data will be loaded by the loader on first access.
+        # loader must be picklable to pass descriptors to worker processes (e.g. functools.partial)
+        self._item_data = None
+        self._item_loader = loader
+
+    def is_loaded(self) -> bool:
+        return self._item_loader is None
+
+    def is_source_item(self) -> bool:
+        # item data was never loaded or replaced, so the item on the server can be reused by id
+        return self._item_data is None and not self.item_modified
 
     # def write_item_local(self, item_path) -> None:
     #     raise NotImplementedError
@@ -37,7 +76,7 @@ class ItemDescriptor:
         self.info.item_info = item_info
 
     def need_write(self) -> bool:
-        if self.item_data is None:
+        if self._item_data is None and self._item_loader is None:
             return False
         return True
 
@@ -70,7 +109,8 @@ class ItemDescriptor:
 
     def clone_with_item(self, new_item):
         new_obj = self.__class__(self.info, self.item_idx)
-        new_obj.item_data = new_item
+        new_obj._item_data = new_item
+        new_obj.item_modified = self.item_modified or new_item is not self._item_data
         new_obj.res_ds_name = self.res_ds_name
         return new_obj
 
@@ -78,7 +118,9 @@ class ItemDescriptor:
         self.info: LegacyProjectItem
         new_info = self.info._replace(item_name=new_name)
         new_obj = self.__class__(new_info, self.item_idx)
-        new_obj.item_data = self.item_data
+        new_obj._item_data = self._item_data
+        new_obj._item_loader = self._item_loader
+        new_obj.item_modified = self.item_modified
         new_obj.res_ds_name = self.res_ds_name
         return new_obj
 
@@ -108,12 +150,15 @@ class ImageDescriptor(ItemDescriptor):
         ensure_base_path(img_path)
         cv2.imwrite(img_path, img_res)
 
-    def encode_image(self) -> bytes:
+    def encode_image(self, ext: str = ".png", jpeg_quality: int = 95) -> bytes:
         if self.item_data is None:
             raise RuntimeError("ImageDescriptor [encode_image] item_data is None.")
         img_res = self.item_data.astype(np.uint8)
         img_res = cv2.cvtColor(img_res, cv2.COLOR_RGB2BGR)
-        res_bytes = cv2.imencode(".png", img_res)[1]
+        params = []
+        if ext in [".jpg", ".jpeg"]:
+            params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        res_bytes = cv2.imencode(ext, img_res, params)[1]
         return res_bytes
 
 
@@ -121,41 +166,141 @@ class VideoDescriptor(ItemDescriptor):
 
     def __init__(self, info: LegacyProjectItem, item_idx: int, modify_ds_name: bool = True):
         super().__init__(info, item_idx, modify_ds_name)
+        # image layers applied to every frame when the video file is read, see add_frame_layer
+        self.frame_layers = []  # (layer, video annotation at the layer input, seed)
+
+    @property
+    def item_data(self):
+        # path to the video file, frame layers are rendered to a new file on first access
+        if len(self.frame_layers) > 0:
+            self.render_frames()
+        return ItemDescriptor.item_data.fget(self)
+
+    @item_data.setter
+    def item_data(self, item):
+        self.frame_layers = []
+        ItemDescriptor.item_data.fset(self, item)
+
+    def get_source_path(self) -> str:
+        # video file without pending frame layers
+        video_path = ItemDescriptor.item_data.fget(self)
+        if video_path is None:
+            raise RuntimeError("No video data available. {}".format(self.get_item_name()))
+        return video_path
 
     def read_video(self) -> cv2.VideoCapture:
-        if self.item_data is not None:
-            return self.item_data
-        video = cv2.VideoCapture(self.get_item_path())
+        video = cv2.VideoCapture(self.get_source_path())
         if not video.isOpened():
-            raise RuntimeError("Video not found. {}".format(self.get_item_path()))
-        self.item_data = video
+            raise RuntimeError("Video not found. {}".format(self.get_source_path()))
         return video
 
-    def write_video_local(self, video_path):
-        if self.item_data is None:
-            raise RuntimeError("No video data available to write.")
-
-        frame_rate = None
-        video_shape = None
-        fourcc = cv2.VideoWriter_fourcc(*"MP4V")
-        video = cv2.VideoWriter(video_path, fourcc, frame_rate, video_shape)
-        for frame in self.item_data:
-            video.write(frame)  # Writing the frame
+    def get_frame_rate(self) -> float:
+        video = self.read_video()
+        frame_rate = video.get(cv2.CAP_PROP_FPS)
         video.release()
+        if not frame_rate > 0:
+            timecodes = self.info.item_info.frames_to_timecodes
+            if len(timecodes) > 1 and timecodes[-1] > 0:
+                frame_rate = (len(timecodes) - 1) / timecodes[-1]
+            else:
+                frame_rate = 30.0
+        return frame_rate
+
+    def add_frame_layer(self, layer, ann, seed: int):
+        # layer.process() is called with every frame as an image item when the frames are read,
+        # figures of the frame in ann are passed as labels
+        new_obj = self.clone_with_name(self.get_item_name())
+        new_obj.frame_layers = self.frame_layers + [(layer, ann, seed)]
+        new_obj.item_modified = True
+        return new_obj
 
-    def encode_video(self):
-        if self.item_data is None:
-            raise RuntimeError("No video data available to encode.")
-
-        import io
+    def clone_with_name(self, new_name):
+        new_obj = super().clone_with_name(new_name)
+        new_obj.frame_layers = list(self.frame_layers)
+        return new_obj
 
-        buffer = io.BytesIO()
-        frame_rate = None
-        video_shape = None
-        fourcc = cv2.VideoWriter_fourcc(*"MP4V")
-        video = cv2.VideoWriter(self.item_data, fourcc, frame_rate, video_shape)
-        for frame in self.item_data:
-            video.write(frame)  # Writing the frame
-        video.release()
-        buffer.seek(0)
-        return buffer.getvalue()
+    def _process_frames(self, frames: List[np.ndarray], first_index: int, frame_layers: list):
+        for layer, frames_labels, seed in frame_layers:
+            for idx, frame in enumerate(frames):
+                img_desc = ImageDescriptor(self.info, self.item_idx, False)
+                img_desc.update_item(frame)
+                # random params of the layer are the same for every frame of the video
+                img_desc.random_state = np.random.RandomState(seed)
+                labels = frames_labels.get(first_index + idx, [])
+                frame_ann = Annotation(frame.shape[:2], labels=labels)
+                out_desc, _ = next(iter(layer.process((img_desc, frame_ann))))
+                frames[idx] = out_desc.read_image()
+        return frames
+
+    def iter_frames(self, chunk_size: int = 32) -> Generator[List[np.ndarray], None, None]:
+        """
+        Reads RGB frames of the video in chunks of chunk_size frames with frame layers applied.
+        Only one chunk is kept in memory.
+        """
+        frame_layers = [
+            (layer, get_frames_labels(ann), seed) for layer, ann, seed in self.frame_layers
+        ]
+        video = self.read_video()
+        try:
+            first_index = 0
+            while True:
+                frames = []
+                while len(frames) < chunk_size:
+                    ok, frame = video.read()
+                    if not ok:
+                        break
+                    frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                if len(frames) == 0:
+                    return
+                yield self._process_frames(frames, first_index, frame_layers)
+                first_index += len(frames)
+        finally:
+            video.release()
+
+    def write_video_local(self, video_path: str, chunk_size: int = 32) -> None:
+        # frames are piped to ffmpeg, which encodes the video once and copies the source audio
+        frame_rate = self.get_frame_rate()
+        ensure_base_path(video_path)
+        encoder = None
+        try:
+            for frames in self.iter_frames(chunk_size):
+                if encoder is None:
+                    height, width = frames[0].shape[:2]
+                    encoder = VideoEncoder(
+                        video_path, width, height, frame_rate, self.get_source_path()
+                    )
+                for frame in frames:
+                    encoder.write(frame)
+            if encoder is None:
+                raise RuntimeError("No frames to write. {}".format(self.get_source_path()))
+            encoder.close()
+        except BaseException:
+            if encoder is not None:
+                encoder.abort()
+            silent_remove(video_path)
+            raise
+
+    def render_frames(self) -> None:
+        # writes frames with frame layers applied next to the source video, so the file
+        # is removed together with the source
+        src_path = self.get_source_path()
+        root, ext = os.path.splitext(src_path)
+        video_path = "{}_{}{}".format(root, rand_str(8), ext)
+        tm = TinyTimer()
+        self.write_video_local(video_path, g.VIDEO_FRAMES_CHUNK)
+        logger.debug(
+            "Video frames rendered",
+            extra={"video": self.get_item_name(), "sec": round(tm.get_sec(), 2)},
+        )
+        self.frame_layers = []
+        self._item_data = video_path
+
+
+def get_frames_labels(ann: VideoAnnotation) -> Dict[int, List[Label]]:
+    # figures of the video frames as image labels
+    frames_labels = {}
+    for frame in ann.frames:
+        frames_labels[frame.index] = [
+            Label(figure.geometry, figure.video_object.obj_class) for figure in frame.figures
+        ]
+    return frames_labels
@@ -1,18 +1,51 @@
 # coding: utf-8
 
-from typing import Tuple
+from typing import List, Tuple, Union
 
 import cv2
 import numpy as np
 
-from supervisely import Annotation
+from supervisely import Annotation, Label, VideoAnnotation
 
 from src.compute.Layer import Layer
-from src.compute.dtl_utils.item_descriptor import ImageDescriptor
+from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
+
+
+BLUR_SIGMA = 50
+# gaussian kernel radius chosen by OpenCV for ksize=(0, 0) does not exceed 4 sigma,
+# so blurring a region with this margin gives the same pixels as blurring the whole image
+BLUR_MARGIN = 4 * BLUR_SIGMA
+
+
+def blur_labels(img: np.ndarray, labels: List[Label]) -> None:
+    """Blurs image in place under the labels, processing only their bounding boxes"""
+    img_h, img_w = img.shape[:2]
+    rois = []
+    for label in labels:
+        bbox = label.geometry.to_bbox()
+        top, left = max(bbox.top, 0), max(bbox.left, 0)
+        bottom, right = min(bbox.bottom, img_h - 1), min(bbox.right, img_w - 1)
+        if top > bottom or left > right:
+            continue
+        roi_top, roi_left = max(top - BLUR_MARGIN, 0), max(left - BLUR_MARGIN, 0)
+        roi_bottom = min(bottom + BLUR_MARGIN, img_h - 1)
+        roi_right = min(right + BLUR_MARGIN, img_w - 1)
+        roi = img[roi_top : roi_bottom + 1, roi_left : roi_right + 1]
+        # all regions are blurred before compositing, so overlapping labels read original pixels
+        blurred_roi = cv2.GaussianBlur(roi, ksize=(0, 0), sigmaX=BLUR_SIGMA)
+        rois.append((label, roi_top, roi_left, blurred_roi))
+
+    for label, roi_top, roi_left, blurred_roi in rois:
+        roi_h, roi_w = blurred_roi.shape[:2]
+        roi_mask = np.zeros((roi_h, roi_w), dtype=bool)
+        label.translate(-roi_top, -roi_left).draw(roi_mask, color=True)
+        roi = img[roi_top : roi_top + roi_h, roi_left : roi_left + roi_w]
+        roi[roi_mask] = blurred_roi[roi_mask]
 
 
 class AnonymizeLayer(Layer):
     action = "anonymize"
+    executor_type = "thread"
 
     layer_settings = {
         "required": ["settings"],
@@ -43,20 +76,23 @@ class AnonymizeLayer(Layer):
     def requires_item(self):
         return True
 
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
+    def process(
+        self,
+        data_el: Tuple[Union[ImageDescriptor, VideoDescriptor], Union[Annotation, VideoAnnotation]],
+    ):
         img_desc, ann = data_el
+        if isinstance(img_desc, VideoDescriptor):
+            yield self.process_video_frames(data_el)
+            return
         img = img_desc.read_image()
         img = img.astype(np.uint8)
 
         anon_type = self.settings["type"]
         if anon_type == "blur":
-            anon_img = cv2.GaussianBlur(img, ksize=(0, 0), sigmaX=50)
-            anon_img = np.clip(anon_img, 0, 255).astype(np.uint8)
-            anon_mask = np.zeros(img.shape, dtype=bool)
-            for label in ann.labels:
-                if label.obj_class.name in self.settings["classes"]:
-                    label.draw(anon_mask, color=True)
-            img[anon_mask == True] = anon_img[anon_mask == True]
+            labels = [
+                label for label in ann.labels if label.obj_class.name in self.settings["classes"]
+            ]
+            blur_labels(img, labels)
         elif anon_type == "color":
             for label in ann.labels:
                 if label.obj_class.name in self.settings["classes"]:
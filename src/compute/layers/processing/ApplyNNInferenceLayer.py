@@ -1,6 +1,7 @@
 # coding: utf-8
 from supervisely import logger as sly_logger
-from typing import Tuple, List
+from typing import Dict, Tuple, List
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from os.path import join
 
@@ -10,15 +11,35 @@ from supervisely.nn.inference import Session
 from src.compute.classes_utils import ClassConstants
 from src.compute.tags_utils import TagConstants
 from supervisely.collection.key_indexed_collection import KeyIndexedCollection
-from supervisely import ProjectMeta, Annotation, ObjClass, TagMeta, TagCollection
-import supervisely.imaging.image as sly_image
-from supervisely.io.fs import silent_remove, file_exists
+from supervisely import (
+    Annotation,
+    Bitmap,
+    Label,
+    ObjClass,
+    PointLocation,
+    ProjectMeta,
+    Rectangle,
+    Tag,
+    TagCollection,
+    TagMeta,
+    batched,
+    rand_str,
+)
+from supervisely.geometry.sliding_windows import SlidingWindows
+from supervisely.imaging.image import crop
+from supervisely.io.fs import silent_remove, mkdir
 import src.globals as g
 from supervisely.app import show_dialog
-from src.exceptions import GraphError
+from src.exceptions import BadSettingsError, GraphError
 
 # from src.ui.tabs.run import error_notification
 
+# images modified in the pipeline are encoded once and passed to the model from this directory
+INFERENCE_DIR = join(g.PREVIEW_DIR, "inference")
+
+# source formats kept when modified images are encoded, other images are encoded to png
+INFERENCE_IMAGE_EXTS = [".png", ".jpg", ".jpeg", ".bmp"]
+
 
 def check_model_is_deployed(session_id: int, preview_mode: bool = False):
     try:
@@ -195,51 +216,481 @@ def find_item(
                 index += 1
 
 
-def apply_model_to_image(
+def get_inference_image_ext(item_desc: ImageDescriptor, settings: dict) -> str:
+    encoding = settings.get("image_encoding", "original")
+    if encoding == "jpeg":
+        return ".jpg"
+    if encoding == "png":
+        return ".png"
+    ext = item_desc.info.ia_data.get("item_ext", "").lower()
+    return ext if ext in INFERENCE_IMAGE_EXTS else ".png"
+
+
+def write_encoded_images(item_descs: List[ImageDescriptor], settings: dict) -> List[str]:
+    mkdir(INFERENCE_DIR)
+    jpeg_quality = settings.get("jpeg_quality", 95)
+    image_paths = []
+    for item_desc in item_descs:
+        ext = get_inference_image_ext(item_desc, settings)
+        image_path = join(INFERENCE_DIR, f"{rand_str(10)}_{item_desc.get_item_name()}{ext}")
+        with open(image_path, "wb") as f:
+            f.write(item_desc.encode_image(ext, jpeg_quality).tobytes())
+        image_paths.append(image_path)
+    return image_paths
+
+
+def inference_items(session: Session, item_descs: List[ImageDescriptor], settings: dict):
+    """
+    Unmodified items are sent to the model by image id, so the session downloads them itself.
+    Modified items are encoded once and passed to the session from INFERENCE_DIR.
+    Returns predictions in the input order.
+    """
+    predictions = [None] * len(item_descs)
+    by_id_idxs = []
+    encoded_idxs = []
+    for idx, item_desc in enumerate(item_descs):
+        if not item_desc.item_modified and item_desc.info.item_info is not None:
+            by_id_idxs.append(idx)
+        else:
+            encoded_idxs.append(idx)
+
+    if len(by_id_idxs) > 0:
+        image_ids = [item_descs[idx].info.item_info.id for idx in by_id_idxs]
+        for idx, pred_ann in zip(by_id_idxs, session.inference_image_ids(image_ids)):
+            predictions[idx] = pred_ann
+
+    if len(encoded_idxs) > 0:
+        image_paths = write_encoded_images([item_descs[idx] for idx in encoded_idxs], settings)
+        try:
+            for idx, pred_ann in zip(encoded_idxs, session.inference_image_paths(image_paths)):
+                predictions[idx] = pred_ann
+        finally:
+            for image_path in image_paths:
+                silent_remove(image_path)
+    return predictions
+
+
+def inference_sub_batch(session: Session, item_descs: List[ImageDescriptor], settings: dict):
+    retries = settings.get("inference_retries", 2)
+    for attempt in range(retries + 1):
+        try:
+            return inference_items(session, item_descs, settings)
+        except Exception as e:
+            names = ", ".join(item_desc.get_item_name() for item_desc in item_descs)
+            if attempt == retries:
+                sly_logger.warn(f"Could not apply model to images: {names}", exc_info=True)
+                return [None] * len(item_descs)
+            sly_logger.debug(f"Inference failed for images: {names}. Retrying. Error: {e}")
+
+
+def dispatch_inference(session: Session, item_descs: List[ImageDescriptor], settings: dict):
+    """
+    Splits items into sub-batches of "inference_batch_size" and keeps up to
+    "inference_concurrency" requests in flight to the session.
+    Only failed sub-batches are retried, their predictions are None when retries are exhausted.
+    Returns predictions in the input order.
+    """
+    sub_batch_size = settings.get("inference_batch_size", 16)
+    concurrency = settings.get("inference_concurrency", 2)
+    sub_batches = list(batched(item_descs, sub_batch_size))
+    if len(sub_batches) == 1 or concurrency == 1:
+        results = [inference_sub_batch(session, sub_batch, settings) for sub_batch in sub_batches]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(inference_sub_batch, session, sub_batch, settings)
+                for sub_batch in sub_batches
+            ]
+            results = [future.result() for future in futures]
+    return [pred_ann for sub_batch_result in results for pred_ann in sub_batch_result]
+
+
+def get_label_score(label: Label) -> float:
+    confidence_tag = label.tags.get("confidence")
+    if confidence_tag is None or confidence_tag.value is None:
+        return 1.0
+    return float(confidence_tag.value)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> List[int]:
+    """boxes: [N, 4] array of (top, left, bottom, right). Returns indexes of kept boxes"""
+    top, left, bottom, right = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (bottom - top + 1) * (right - left + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        idx = order[0]
+        keep.append(int(idx))
+        inter_h = np.maximum(
+            0, np.minimum(bottom[idx], bottom[order[1:]]) - np.maximum(top[idx], top[order[1:]]) + 1
+        )
+        inter_w = np.maximum(
+            0, np.minimum(right[idx], right[order[1:]]) - np.maximum(left[idx], left[order[1:]]) + 1
+        )
+        inter = inter_h * inter_w
+        iou = inter / (areas[idx] + areas[order[1:]] - inter)
+        order = order[1:][iou <= iou_threshold]
+    return keep
+
+
+def intersect_rects(rect_a: Rectangle, rect_b: Rectangle) -> Rectangle:
+    top, left = max(rect_a.top, rect_b.top), max(rect_a.left, rect_b.left)
+    bottom, right = min(rect_a.bottom, rect_b.bottom), min(rect_a.right, rect_b.right)
+    if top > bottom or left > right:
+        return None
+    return Rectangle(top, left, bottom, right)
+
+
+def get_mask_in_rect(bitmap: Bitmap, rect: Rectangle) -> np.ndarray:
+    """Returns the part of the bitmap inside the rect as a mask of the rect size"""
+    mask = np.zeros((rect.height, rect.width), dtype=bool)
+    data_rect = Rectangle.from_array(bitmap.data).translate(bitmap.origin.row, bitmap.origin.col)
+    inter = intersect_rects(data_rect, rect)
+    if inter is not None:
+        mask[
+            inter.top - rect.top : inter.bottom - rect.top + 1,
+            inter.left - rect.left : inter.right - rect.left + 1,
+        ] = bitmap.data[
+            inter.top - data_rect.top : inter.bottom - data_rect.top + 1,
+            inter.left - data_rect.left : inter.right - data_rect.left + 1,
+        ]
+    return mask
+
+
+def get_tiles_masks_iou(
+    tile_rect_a: Rectangle, bitmap_a: Bitmap, tile_rect_b: Rectangle, bitmap_b: Bitmap
+) -> float:
+    """IoU of two masks predicted on different tiles, measured where both tiles see the image"""
+    overlap = intersect_rects(tile_rect_a, tile_rect_b)
+    if overlap is None:
+        return 0.0
+    mask_a = get_mask_in_rect(bitmap_a, overlap)
+    mask_b = get_mask_in_rect(bitmap_b, overlap)
+    union = np.count_nonzero(mask_a | mask_b)
+    if union == 0:
+        return 0.0
+    return np.count_nonzero(mask_a & mask_b) / union
+
+
+def merge_tiles_bitmaps(
+    img_hw: Tuple[int, int],
+    tiles_rects: List[Rectangle],
+    instances: List[Tuple[int, Label]],
+    iou_threshold: float,
+    masks_merge: str,
+) -> List[Label]:
+    """
+    instances: (tile index, label) pairs of one class in image coordinates.
+    An instance is matched to an instance of another tile if their masks overlap with
+    IoU > iou_threshold in the overlap of the tiles. Every group of matched instances
+    (at most one per tile) is merged into one label: by logical OR or by voting of the tiles
+    covering the pixel. Instances predicted on a single tile stay separate labels.
+    """
+    instances = sorted(instances, key=lambda instance: get_label_score(instance[1]), reverse=True)
+    groups = []  # [(tile index, label)] sorted by score
+    for tile_idx, label in instances:
+        bbox = label.geometry.to_bbox()
+        best_group, best_iou = None, iou_threshold
+        for group in groups:
+            if any(member_tile_idx == tile_idx for member_tile_idx, _ in group):
+                continue
+            for member_tile_idx, member in group:
+                if intersect_rects(bbox, member.geometry.to_bbox()) is None:
+                    continue
+                iou = get_tiles_masks_iou(
+                    tiles_rects[tile_idx],
+                    label.geometry,
+                    tiles_rects[member_tile_idx],
+                    member.geometry,
+                )
+                if iou > best_iou:
+                    best_group, best_iou = group, iou
+        if best_group is None:
+            groups.append([(tile_idx, label)])
+        else:
+            best_group.append((tile_idx, label))
+
+    res_labels = []
+    for group in groups:
+        bboxes = [label.geometry.to_bbox() for _, label in group]
+        region = Rectangle(
+            max(0, min(bbox.top for bbox in bboxes)),
+            max(0, min(bbox.left for bbox in bboxes)),
+            min(img_hw[0] - 1, max(bbox.bottom for bbox in bboxes)),
+            min(img_hw[1] - 1, max(bbox.right for bbox in bboxes)),
+        )
+        # group members come from different tiles, so every tile votes at most once per pixel
+        votes = np.zeros((region.height, region.width), dtype=np.uint16)
+        for _, label in group:
+            votes += get_mask_in_rect(label.geometry, region)
+        if masks_merge == "vote":
+            coverage = np.zeros_like(votes)
+            for tile_rect in tiles_rects:
+                inter = intersect_rects(tile_rect, region)
+                if inter is not None:
+                    coverage[
+                        inter.top - region.top : inter.bottom - region.top + 1,
+                        inter.left - region.left : inter.right - region.left + 1,
+                    ] += 1
+            merged_mask = votes * 2 > coverage
+        else:
+            merged_mask = votes > 0
+        if not merged_mask.any():
+            continue
+        # tags (e.g. confidence) are taken from the instance with the highest score
+        geometry = Bitmap(merged_mask, origin=PointLocation(region.top, region.left))
+        res_labels.append(group[0][1].clone(geometry=geometry))
+    return res_labels
+
+
+def merge_tiles_predictions(
+    img_hw: Tuple[int, int],
+    tiles_rects: List[Rectangle],
+    tiles_preds: List[Annotation],
+    sw_settings: dict,
+) -> Annotation:
+    """
+    Moves tile predictions to image coordinates and merges predictions of the same object
+    made on overlapping tiles. Bitmaps are matched by mask IoU, see merge_tiles_bitmaps.
+    Other geometries are filtered by per-class NMS of their bounding boxes.
+    """
+    iou_threshold = sw_settings.get("nms_iou_threshold", 0.5)
+    masks_merge = sw_settings.get("masks_merge", "or")
+
+    bitmaps = {}  # class name -> [(tile index, label)]
+    others = {}  # class name -> [label]
+    for tile_idx, (rect, pred_ann) in enumerate(zip(tiles_rects, tiles_preds)):
+        if pred_ann is None:
+            continue
+        for label in pred_ann.labels:
+            label = label.translate(rect.top, rect.left)
+            if isinstance(label.geometry, Bitmap):
+                bitmaps.setdefault(label.obj_class.name, []).append((tile_idx, label))
+            else:
+                others.setdefault(label.obj_class.name, []).append(label)
+
+    res_labels = []
+    for instances in bitmaps.values():
+        res_labels.extend(
+            merge_tiles_bitmaps(img_hw, tiles_rects, instances, iou_threshold, masks_merge)
+        )
+
+    for labels in others.values():
+        bboxes = [label.geometry.to_bbox() for label in labels]
+        boxes = np.array([[b.top, b.left, b.bottom, b.right] for b in bboxes], dtype=np.float32)
+        scores = np.array([get_label_score(label) for label in labels], dtype=np.float32)
+        for idx in nms(boxes, scores, iou_threshold):
+            res_labels.append(labels[idx])
+
+    return Annotation(img_size=img_hw, labels=res_labels)
+
+
+def inference_sliding_window(
     session: Session,
-    image_path: str,
-    image_shape: tuple,
-    image_desc: ImageDescriptor,
-    model_meta: ProjectMeta,
-    output_meta: ProjectMeta,
+    image_descs: List[ImageDescriptor],
+    image_shapes: List[tuple],
     settings: dict,
-):
-    try:
-        pred_ann = session.inference_image_path(image_path)
-        pred_ann, res_meta = postprocess_ann(pred_ann, output_meta, model_meta, settings)
-    except:
-        sly_logger.warn(
-            f"Could not apply model to image: {image_desc.info.item_info.name}(ID: {image_desc.info.item_info.id})"
+) -> List[Annotation]:
+    """
+    Splits every image into windows the way SlidingWindowLayer does, sends tiles of all
+    images in the batch as combined inference requests and merges tile predictions
+    back in image coordinates.
+    """
+    sw_settings = settings["sliding_window"]
+    window_wh = (sw_settings["window"]["width"], sw_settings["window"]["height"])
+    min_overlap_xy = (sw_settings["min_overlap"]["x"], sw_settings["min_overlap"]["y"])
+    sliding_windows = SlidingWindows(window_wh, min_overlap_xy)
+
+    tiles_descs = []
+    tiles_rects = []
+    for image_desc, image_shape in zip(image_descs, image_shapes):
+        img = image_desc.read_image()
+        image_rects = list(sliding_windows.get(image_shape[:2]))
+        tiles_rects.append(image_rects)
+        for rect in image_rects:
+            tiles_descs.append(image_desc.clone_with_item(crop(img, rect)))
+
+    tiles_preds = dispatch_inference(session, tiles_descs, settings)
+
+    predictions = []
+    tile_idx = 0
+    for image_shape, image_rects in zip(image_shapes, tiles_rects):
+        image_tiles_preds = tiles_preds[tile_idx : tile_idx + len(image_rects)]
+        tile_idx += len(image_rects)
+        if len(image_rects) > 0 and all(pred is None for pred in image_tiles_preds):
+            predictions.append(None)
+            continue
+        predictions.append(
+            merge_tiles_predictions(image_shape[:2], image_rects, image_tiles_preds, sw_settings)
         )
-        pred_ann = Annotation(img_size=image_shape[:2])
-    finally:
-        return pred_ann
+    return predictions
+
+
+def get_padding_pixels(raw_side: int, side_padding_settings: str) -> int:
+    if side_padding_settings is None:
+        return 0
+    if side_padding_settings.endswith("px"):
+        return int(side_padding_settings[: -len("px")])
+    if side_padding_settings.endswith("%"):
+        return int(raw_side * float(side_padding_settings[: -len("%")]) / 100.0)
+    raise ValueError(
+        'Unknown padding size format: {}. Expected absolute values as "5px" or relative as "5%"'.format(
+            side_padding_settings
+        )
+    )
+
+
+def get_roi_rect(bbox: Rectangle, pad_sides: dict, img_hw: Tuple[int, int]) -> Rectangle:
+    """Pads object bbox the same way InstancesCropLayer does and clips it to the image"""
+    padded = Rectangle(
+        top=bbox.top - get_padding_pixels(bbox.height, pad_sides.get("top")),
+        left=bbox.left - get_padding_pixels(bbox.width, pad_sides.get("left")),
+        bottom=bbox.bottom + get_padding_pixels(bbox.height, pad_sides.get("bottom")),
+        right=bbox.right + get_padding_pixels(bbox.width, pad_sides.get("right")),
+    )
+    clipped = padded.crop(Rectangle.from_size(img_hw))
+    if len(clipped) == 0:
+        return None
+    return clipped[0]
+
+
+def inference_roi(
+    session: Session,
+    image_descs: List[ImageDescriptor],
+    image_shapes: List[tuple],
+    anns: List[Annotation],
+    settings: dict,
+) -> List[Annotation]:
+    """
+    Crops padded bboxes of the labels of selected classes, sends crops of all images in
+    the batch as combined inference requests and moves predicted labels back to image
+    coordinates. Images without ROIs are not sent to the model.
+    Image tags predicted for a crop (e.g. by a classifier) belong to the label it was cropped by,
+    they are returned as {label index: tags} for every image.
+    """
+    roi_settings = settings["roi"]
+    roi_classes = set(roi_settings["classes"])
+    pad_sides = roi_settings.get("pad", {}).get("sides", {})
+
+    crops_descs = []
+    crops_rects = []
+    crops_labels_idxs = []
+    for image_desc, image_shape, ann in zip(image_descs, image_shapes, anns):
+        image_rects = []
+        image_labels_idxs = []
+        img = None
+        for label_idx, label in enumerate(ann.labels):
+            if label.obj_class.name not in roi_classes:
+                continue
+            rect = get_roi_rect(label.geometry.to_bbox(), pad_sides, image_shape[:2])
+            if rect is None:
+                continue
+            if img is None:
+                img = image_desc.read_image()
+            image_rects.append(rect)
+            image_labels_idxs.append(label_idx)
+            crops_descs.append(image_desc.clone_with_item(crop(img, rect)))
+        crops_rects.append(image_rects)
+        crops_labels_idxs.append(image_labels_idxs)
+
+    crops_preds = dispatch_inference(session, crops_descs, settings)
+
+    predictions = []
+    rois_tags = []
+    crop_idx = 0
+    for image_shape, image_rects, image_labels_idxs in zip(
+        image_shapes, crops_rects, crops_labels_idxs
+    ):
+        image_crops_preds = crops_preds[crop_idx : crop_idx + len(image_rects)]
+        crop_idx += len(image_rects)
+        if len(image_rects) > 0 and all(pred is None for pred in image_crops_preds):
+            predictions.append(None)
+            rois_tags.append({})
+            continue
+        labels = []
+        image_rois_tags = {}
+        for rect, label_idx, pred_ann in zip(image_rects, image_labels_idxs, image_crops_preds):
+            if pred_ann is None:
+                continue
+            labels.extend(label.translate(rect.top, rect.left) for label in pred_ann.labels)
+            if len(pred_ann.img_tags) > 0:
+                image_rois_tags[label_idx] = list(pred_ann.img_tags)
+        predictions.append(Annotation(img_size=image_shape[:2], labels=labels))
+        rois_tags.append(image_rois_tags)
+    return predictions, rois_tags
+
+
+def tag_roi_labels(
+    ann: Annotation,
+    roi_tags: Dict[int, List[Tag]],
+    output_meta: ProjectMeta,
+    model_meta: ProjectMeta,
+    settings: dict,
+) -> Dict[int, Label]:
+    """Returns {label index: label with the tags predicted for its crop}"""
+    keep_tags = settings["tags"]
+    _, _, tag_meta_mapping = merge_metas(
+        output_meta,
+        model_meta,
+        settings["classes"],
+        keep_tags,
+        settings["model_suffix"],
+        settings["use_model_suffix"],
+    )
+    tagged_labels = {}
+    for label_idx, tags in roi_tags.items():
+        tags = [
+            tag.clone(meta=tag_meta_mapping[tag.meta.name])
+            for tag in tags
+            if tag.meta.name in keep_tags
+        ]
+        if len(tags) > 0:
+            tagged_labels[label_idx] = ann.labels[label_idx].add_tags(tags)
+    return tagged_labels
 
 
 def apply_model_to_images(
     session: Session,
-    image_paths: List[str],
     image_shapes: List[tuple],
-    image_desc: List[ImageDescriptor],
+    image_descs: List[ImageDescriptor],
     model_meta: ProjectMeta,
     output_meta: ProjectMeta,
     settings: dict,
+    anns: List[Annotation] = None,
 ):
+    """
+    Returns predicted annotations and, for every image, {label index: tagged label} for the
+    ROI labels that got tags predicted for their crops.
+    """
     pred_anns = []
+    tagged_labels = [{} for _ in image_shapes]
     try:
-        predictions = session.inference_image_paths(image_paths)
-        for pred_ann in predictions:
+        rois_tags = [{} for _ in image_shapes]
+        if settings["apply_method"] == "roi":
+            predictions, rois_tags = inference_roi(
+                session, image_descs, image_shapes, anns, settings
+            )
+        elif settings["apply_method"] == "sliding_window":
+            predictions = inference_sliding_window(session, image_descs, image_shapes, settings)
+        else:
+            predictions = dispatch_inference(session, image_descs, settings)
+        for idx, (pred_ann, image_shape) in enumerate(zip(predictions, image_shapes)):
+            if pred_ann is None:
+                pred_anns.append(Annotation(img_size=image_shape[:2]))
+                continue
             pred_ann, res_meta = postprocess_ann(pred_ann, output_meta, model_meta, settings)
             pred_anns.append(pred_ann)
+            if len(rois_tags[idx]) > 0:
+                tagged_labels[idx] = tag_roi_labels(
+                    anns[idx], rois_tags[idx], output_meta, model_meta, settings
+                )
     except:
-        # FIX FOR BATCH
-        sly_logger.warn(
-            f"Could not apply model to image: {image_desc.info.item_info.name}(ID: {image_desc.info.item_info.id})"
-        )
-
+        names = ", ".join(image_desc.get_item_name() for image_desc in image_descs)
+        sly_logger.warn(f"Could not apply model to images: {names}", exc_info=True)
         pred_anns = [Annotation(img_size=image_shape[:2]) for image_shape in image_shapes]
+        tagged_labels = [{} for _ in image_shapes]
     finally:
-        return pred_anns
+        return pred_anns, tagged_labels
 
 
 class ApplyNNInferenceLayer(Layer):
@@ -274,6 +725,57 @@ class ApplyNNInferenceLayer(Layer):
                     "use_model_suffix": {"type": "boolean"},
                     "add_pred_ann_method": {"type": "string", "enum": ["merge", "replace"]},
                     "apply_method": {"type": "string", "enum": ["image", "roi", "sliding_window"]},
+                    "image_encoding": {"type": "string", "enum": ["original", "png", "jpeg"]},
+                    "jpeg_quality": {"type": "integer", "minimum": 1, "maximum": 100},
+                    "inference_batch_size": {"type": "integer", "minimum": 1},
+                    "inference_concurrency": {"type": "integer", "minimum": 1},
+                    "inference_retries": {"type": "integer", "minimum": 0},
+                    "roi": {
+                        "type": "object",
+                        "required": ["classes"],
+                        "properties": {
+                            "classes": {"type": "array", "items": {"type": "string"}},
+                            "pad": {
+                                "type": "object",
+                                "required": ["sides"],
+                                "properties": {
+                                    "sides": {
+                                        "type": "object",
+                                        "patternProperties": {
+                                            "(left)|(top)|(bottom)|(right)": {
+                                                "type": "string",
+                                                "pattern": "^[0-9]+(%)|(px)$",
+                                            }
+                                        },
+                                    }
+                                },
+                            },
+                        },
+                    },
+                    "sliding_window": {
+                        "type": "object",
+                        "required": ["window", "min_overlap"],
+                        "properties": {
+                            "window": {
+                                "type": "object",
+                                "required": ["height", "width"],
+                                "properties": {
+                                    "height": {"type": "integer", "minimum": 1},
+                                    "width": {"type": "integer", "minimum": 1},
+                                },
+                            },
+                            "min_overlap": {
+                                "type": "object",
+                                "required": ["x", "y"],
+                                "properties": {
+                                    "x": {"type": "integer", "minimum": 0},
+                                    "y": {"type": "integer", "minimum": 0},
+                                },
+                            },
+                            "nms_iou_threshold": {"type": "number", "minimum": 0, "maximum": 1},
+                            "masks_merge": {"type": "string", "enum": ["or", "vote"]},
+                        },
+                    },
                     "classes": {
                         "oneOf": [
                             {"type": "string"},
@@ -300,9 +802,15 @@ class ApplyNNInferenceLayer(Layer):
                 raise GraphError("Apply NN layer requires model to be connected")
             check_model_is_deployed(self.settings["session_id"], self.net.preview_mode)
             super().validate()
+        apply_method = self.settings["apply_method"]
+        if apply_method in ["roi", "sliding_window"] and apply_method not in self.settings:
+            raise BadSettingsError(
+                f'Apply NN layer: "{apply_method}" settings are required for the selected apply method'
+            )
 
     def requires_item(self):
-        return True
+        # whole unmodified images are sent to the model by id, crops and tiles need pixels
+        return self.settings["apply_method"] != "image"
 
     def modifies_data(self):
         return True
@@ -365,104 +873,73 @@ class ApplyNNInferenceLayer(Layer):
         self.tag_mapping[TagConstants.NEW] = new_tag_metas
 
     def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
-        img_desc, ann = data_el
-        img = img_desc.read_image()
-        img = img.astype(np.uint8)
-
-        if self.settings["session_id"] is None:
-            new_img_desc = img_desc.clone_with_item(img)
-            if not self.net.preview_mode:
-                raise ValueError("Apply NN layer requires model to be connected")
-            else:
-                sly_logger.warn("Model is not connected. Couldn't apply model to preview image.")
-        else:
-            img_path = join(
-                f"{g.PREVIEW_DIR}",
-                f"{img_desc.info.item_name}{img_desc.info.ia_data['item_ext']}",
+        for layer_outputs in self.process_batch([data_el]):
+            yield from layer_outputs
+
+    def apply_model(self, session_id, item_descs, item_shapes, model_meta, anns=None):
+        try:
+            session = Session(g.api, session_id)
+            pred_anns, tagged_labels = apply_model_to_images(
+                session,
+                item_shapes,
+                item_descs,
+                model_meta,
+                self.output_meta,
+                self.settings,
+                anns,
             )
-
-            session_id = self.settings["session_id"]
-            model_meta = ProjectMeta().from_json(self.settings["model_meta"])
-            apply_method = self.settings["apply_method"]
-            if apply_method == "image":
-                sly_image.write(img_path, img)
+        except:
+            if not self.net.preview_mode:
+                g.warn_notification.set(
+                    title="Model is not responding. Attempting to reconnect...",
+                    description=(
+                        "Make sure that the "
+                        f"<a href='{g.api.server_address}{g.api.app.get_url(session_id)}' target='_blank'>app session</a> "
+                        "is running and the model is served."
+                    ),
+                )
+                g.warn_notification.show()
                 try:
                     session = Session(g.api, session_id)
-                    pred_ann = apply_model_to_image(
+                    g.warn_notification.hide()
+                    pred_anns, tagged_labels = apply_model_to_images(
                         session,
-                        img_path,
-                        img.shape,
-                        img_desc,
+                        item_shapes,
+                        item_descs,
                         model_meta,
                         self.output_meta,
                         self.settings,
+                        anns,
                     )
                 except:
-                    if not self.net.preview_mode:
-                        g.warn_notification.set(
-                            title="Model is not responding. Attempting to reconnect...",
-                            description=(
-                                "Make sure that the "
-                                f"<a href='{g.api.server_address}{g.api.app.get_url(session_id)}' target='_blank'>app session</a> "
-                                "is running and the model is served."
-                            ),
+                    g.api.app.stop(session_id)
+                    g.pipeline_running = False
+                    raise ValueError(
+                        (
+                            "Something went wrong while applying model to images batch. Pipeline will be stopped. "
+                            f"Shutting down the model session ID: '{session_id}'."
                         )
-                        g.warn_notification.show()
-                        try:
-                            session = Session(g.api, session_id)
-                            g.warn_notification.hide()
-                            pred_ann = apply_model_to_image(
-                                session,
-                                img_path,
-                                img.shape,
-                                img_desc,
-                                model_meta,
-                                self.output_meta,
-                                self.settings,
-                            )
-                        except:
-                            g.api.app.stop(session_id)
-                            g.pipeline_running = False
-                            raise ValueError(
-                                (
-                                    "Something went wrong while applying model to image. Pipeline will be stopped. "
-                                    f"Shutting down the model session ID: '{session_id}'."
-                                )
-                            )
-                    else:
-                        show_dialog(
-                            title="Couldn't preview image",
-                            description=(
-                                "Model is not served. "
-                                "<br>Check model session logs by visiting app session page: "
-                                f"<a href='{g.api.server_address}{g.api.app.get_url(session_id)}' target='_blank'>open app</a> "
-                            ),
-                            status="warning",
-                        )
-
-                if file_exists(img_path):
-                    silent_remove(img_path)
-
-            elif apply_method == "roi":
-                pass
-            elif apply_method == "sliding_window":
-                pass
-
-            add_pred_ann_method = self.settings["add_pred_ann_method"]
-            if add_pred_ann_method == "merge":
-                ann = ann.merge(pred_ann)
-            elif add_pred_ann_method == "replace":
-                ann = pred_ann
-
-            new_img_desc = img_desc.clone_with_item(img)
-            yield new_img_desc, ann
+                    )
+            else:
+                show_dialog(
+                    title="Couldn't preview image",
+                    description=(
+                        "Model is not served. "
+                        "<br>Check model session logs by visiting app session page: "
+                        f"<a href='{g.api.server_address}{g.api.app.get_url(session_id)}' target='_blank'>open app</a> "
+                    ),
+                    status="warning",
+                )
+                pred_anns = [Annotation(img_size=item_shape[:2]) for item_shape in item_shapes]
+                tagged_labels = [{} for _ in item_shapes]
+        return pred_anns, tagged_labels
 
     def process_batch(self, data_els: List[Tuple[ImageDescriptor, Annotation]]):
         item_descs, anns = zip(*data_els)
 
         pred_anns = []
+        new_item_descs = item_descs
         if self.settings["session_id"] is None:
-            new_item_descs = item_descs
             if not self.net.preview_mode:
                 raise ValueError("Apply NN layer requires model to be connected")
             else:
@@ -470,97 +947,50 @@ class ApplyNNInferenceLayer(Layer):
         else:
             session_id = self.settings["session_id"]
             model_meta = ProjectMeta().from_json(self.settings["model_meta"])
-            apply_method = self.settings["apply_method"]
-            if apply_method == "image":
-                item_shapes = []
-                item_paths = []
-                new_item_descs = []
-
-                for item_desc in item_descs:
-                    item_desc: ImageDescriptor
-                    item = item_desc.read_image()
-                    item = item.astype(np.uint8)
-                    item_path = join(
-                        f"{g.PREVIEW_DIR}",
-                        f"{item_desc.info.item_name}{item_desc.info.ia_data['item_ext']}",
-                    )
-                    sly_image.write(item_path, item)
-                    new_item_desc = item_desc.clone_with_item(item)
-
-                    item_shapes.append(item.shape)
-                    item_paths.append(item_path)
-                    new_item_descs.append(new_item_desc)
-                try:
-                    session = Session(g.api, session_id)
-                    pred_anns = apply_model_to_images(
-                        session,
-                        item_paths,
-                        item_shapes,
-                        item_descs,
-                        model_meta,
-                        self.output_meta,
-                        self.settings,
-                    )
-                except:
-                    if not self.net.preview_mode:
-                        g.warn_notification.set(
-                            title="Model is not responding. Attempting to reconnect...",
-                            description=(
-                                "Make sure that the "
-                                f"<a href='{g.api.server_address}{g.api.app.get_url(session_id)}' target='_blank'>app session</a> "
-                                "is running and the model is served."
-                            ),
-                        )
-                        g.warn_notification.show()
-                        try:
-                            session = Session(g.api, session_id)
-                            g.warn_notification.hide()
-                            pred_anns = apply_model_to_images(
-                                session,
-                                item_paths,
-                                item_shapes,
-                                item_descs,
-                                model_meta,
-                                self.output_meta,
-                                self.settings,
-                            )
-                        except:
-                            g.api.app.stop(session_id)
-                            g.pipeline_running = False
-                            raise ValueError(
-                                (
-                                    "Something went wrong while applying model to images batch. Pipeline will be stopped. "
-                                    f"Shutting down the model session ID: '{session_id}'."
-                                )
-                            )
-                    else:
-                        show_dialog(
-                            title="Couldn't preview image",
-                            description=(
-                                "Model is not served. "
-                                "<br>Check model session logs by visiting app session page: "
-                                f"<a href='{g.api.server_address}{g.api.app.get_url(session_id)}' target='_blank'>open app</a> "
-                            ),
-                            status="warning",
-                        )
-
-                for item_path in item_paths:
-                    if file_exists(item_path):
-                        silent_remove(item_path)
-
-            elif apply_method == "roi":
-                pass
-            elif apply_method == "sliding_window":
-                pass
+            item_shapes = []
+            new_item_descs = []
+
+            for item_desc in item_descs:
+                item_desc: ImageDescriptor
+                item_info = item_desc.info.item_info
+                if (
+                    self.settings["apply_method"] == "image"
+                    and item_info is not None
+                    and item_desc.is_source_item()
+                ):
+                    # sent to the model by id, so the image is not downloaded
+                    item_shapes.append((item_info.height, item_info.width, 3))
+                    new_item_descs.append(item_desc)
+                    continue
+                item = item_desc.read_image()
+                item = item.astype(np.uint8, copy=False)
+                new_item_desc = item_desc.clone_with_item(item)
+
+                item_shapes.append(item.shape)
+                new_item_descs.append(new_item_desc)
+
+            pred_anns, tagged_labels = self.apply_model(
+                session_id, new_item_descs, item_shapes, model_meta, anns
+            )
 
             add_pred_ann_method = self.settings["add_pred_ann_method"]
             if add_pred_ann_method == "merge":
                 new_anns = []
-                for ann, pred_ann in zip(anns, pred_anns):
+                for ann, pred_ann, image_tagged_labels in zip(anns, pred_anns, tagged_labels):
+                    if len(image_tagged_labels) > 0:
+                        labels = [
+                            image_tagged_labels.get(idx, label)
+                            for idx, label in enumerate(ann.labels)
+                        ]
+                        ann = ann.clone(labels=labels)
                     ann = ann.merge(pred_ann)
                     new_anns.append(ann)
             elif add_pred_ann_method == "replace":
-                new_anns = pred_anns
+                # ROI labels are kept when the model predicted tags for them
+                new_anns = [
+                    pred_ann.add_labels(list(image_tagged_labels.values()))
+                    for pred_ann, image_tagged_labels in zip(pred_anns, tagged_labels)
+                ]
             yield tuple(zip(new_item_descs, new_anns))
 
     def has_batch_processing(self):
@@ -1,18 +1,19 @@
 # coding: utf-8
 
-from typing import List, Tuple
+from typing import List, Tuple, Union
 import cv2
 import numpy as np
 
-from supervisely import Annotation
+from supervisely import Annotation, VideoAnnotation
 
 from src.compute.Layer import Layer
-from src.compute.dtl_utils.item_descriptor import ImageDescriptor
+from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
 from src.exceptions import BadSettingsError
 
 
 class BlurLayer(Layer):
     action = "blur"
+    executor_type = "process"
 
     layer_settings = {
         "required": ["settings"],
@@ -79,14 +80,20 @@ class BlurLayer(Layer):
     def modifies_data(self):
         return True
 
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
+    def process(
+        self,
+        data_el: Tuple[Union[ImageDescriptor, VideoDescriptor], Union[Annotation, VideoAnnotation]],
+    ):
         img_desc, ann = data_el
+        if isinstance(img_desc, VideoDescriptor):
+            yield self.process_video_frames(data_el)
+            return
 
         img = img_desc.read_image()
         img = img.astype(np.uint8)
         if self.settings["name"] == "gaussian":
             sigma_b = self.settings["sigma"]
-            sigma_value = np.random.uniform(sigma_b["min"], sigma_b["max"])
+            sigma_value = self.get_random_state(img_desc).uniform(sigma_b["min"], sigma_b["max"])
             res_img = cv2.GaussianBlur(img, ksize=(0, 0), sigmaX=sigma_value)
         elif self.settings["name"] == "median":
             res_img = cv2.medianBlur(img, ksize=self.settings["kernel"])
@@ -3,6 +3,7 @@
 import numpy as np
 
 from src.compute.Layer import Layer
+from src.compute.dtl_utils.item_descriptor import VideoDescriptor
 from src.exceptions import BadSettingsError
 
 
@@ -59,16 +60,20 @@ class ContrastBrightnessLayer(Layer):
 
     def process(self, data_el):
         img_desc, ann_orig = data_el
+        if isinstance(img_desc, VideoDescriptor):
+            yield self.process_video_frames(data_el)
+            return
 
+        random_state = self.get_random_state(img_desc)
         contrast_b = self.settings["contrast"]
-        contrast_value = np.random.uniform(contrast_b["min"], contrast_b["max"])
+        contrast_value = random_state.uniform(contrast_b["min"], contrast_b["max"])
         if contrast_b.get("center_grey", False):
             contrast_c = 128
         else:
             contrast_c = 0
 
         brightness_b = self.settings["brightness"]
-        brightness_value = np.random.uniform(brightness_b["min"], brightness_b["max"])
+        brightness_value = random_state.uniform(brightness_b["min"], brightness_b["max"])
 
         img = img_desc.read_image()
         img = img.astype(np.float32)
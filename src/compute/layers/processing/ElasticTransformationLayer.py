@@ -13,6 +13,7 @@ from supervisely.aug.imgaug_utils import apply as apply_augs
 
 class ElasticTransformationLayer(Layer):
     action = "elastic_transformation"
+    executor_type = "process"
 
     layer_settings = {
         "required": ["settings"],
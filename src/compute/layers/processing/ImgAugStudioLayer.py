@@ -2,7 +2,9 @@
 
 from copy import copy
 from src.compute.Layer import Layer
-from typing import Tuple
+from typing import List, Tuple
+
+import numpy as np
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor
 import supervisely as sly
 from supervisely import Bitmap, Annotation, ObjClass, ProjectMeta, Polygon
@@ -44,6 +46,7 @@ class ImgAugStudioLayer(Layer):
     def __init__(self, config, net):
         Layer.__init__(self, config, net=net)
         self.original_meta = ProjectMeta()
+        self.augs = None
 
     def requires_item(self):
         return True
@@ -71,20 +74,33 @@ class ImgAugStudioLayer(Layer):
         original_meta = original_meta.merge(output_meta)
         return original_meta
 
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
-        img_desc, ann = data_el
+    def preprocess(self):
         pipeline = self.settings["pipeline"]
-        shuffle = self.settings["shuffle"]
-
         if len(pipeline) == 0:
-            yield (img_desc, ann)
-        else:
-            img = img_desc.item_data
-            if self.original_meta != self.output_meta:
-                self.original_meta = self.modify_original_meta()
-            augs = sly.imgaug_utils.build_pipeline(pipeline, shuffle)
-            _, res_img, res_ann = sly.imgaug_utils.apply(
-                augs, self.original_meta, img, ann, "instance"
-            )
-            new_img_desc = img_desc.clone_with_item(res_img)
-            yield (new_img_desc, res_ann)
+            return
+        self.original_meta = self.modify_original_meta()
+        self.augs = sly.imgaug_utils.build_pipeline(pipeline, self.settings["shuffle"])
+
+    def augment(self, img_desc: ImageDescriptor, ann: Annotation, seed: int):
+        # pipeline is reseeded per item, so results depend only on the global random state
+        self.augs.seed_(seed)
+        _, res_img, res_ann = sly.imgaug_utils.apply(
+            self.augs, self.original_meta, img_desc.read_image(), ann, "instance"
+        )
+        return img_desc.clone_with_item(res_img), res_ann
+
+    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
+        for outputs in self.process_batch([data_el]):
+            yield from outputs
+
+    def process_batch(self, data_els: List[Tuple[ImageDescriptor, Annotation]]):
+        if self.augs is None:
+            yield tuple(data_els)
+            return
+        seeds = np.random.randint(0, 2**31 - 1, size=len(data_els))
+        yield tuple(
+            self.augment(img_desc, ann, int(seed)) for (img_desc, ann), seed in zip(data_els, seeds)
+        )
+
+    def has_batch_processing(self):
+        return True
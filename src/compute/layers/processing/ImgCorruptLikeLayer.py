@@ -2,14 +2,29 @@
 
 from src.compute.Layer import Layer
 import numpy as np
-from typing import Tuple
+from typing import List, Tuple
 import imgaug.augmenters as iaa
 from supervisely import Annotation
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor
+from src.compute.utils.executors import get_executor
+from src.exceptions import BadSettingsError
+import src.globals as g
+
+
+def _augment_images(aug: iaa.Augmenter, images: List[np.ndarray], seeds: List[int]):
+    # every image is augmented with its own seed, so results do not depend on the chunks
+    aug = aug.deepcopy()
+    res_images = []
+    for img, seed in zip(images, seeds):
+        aug.seed_(seed)
+        res_images.append(aug.augment_image(img))
+    return res_images
 
 
 class ImgCorruptLikeLayer(Layer):
     action = "iaa_imgaug_corruptlike"
+    executor_type = "process"
+    options = {}  # option name -> imgaug.augmenters.imgcorruptlike class
 
     layer_settings = {
         "required": ["settings"],
@@ -27,118 +42,118 @@ class ImgCorruptLikeLayer(Layer):
 
     def __init__(self, config, net):
         Layer.__init__(self, config, net=net)
+        self.aug = None
 
     def requires_item(self):
         return True
 
+    def validate(self):
+        super().validate()
+        option = self.settings.get("option")
+        if option not in self.options:
+            raise BadSettingsError(
+                f'Unknown option "{option}". Available: {", ".join(self.options.keys())}'
+            )
+
+    def preprocess(self):
+        self.aug = self.options[self.settings["option"]](severity=self.settings["severity"])
+
+    def get_aug(self) -> iaa.Augmenter:
+        if self.aug is None:
+            self.preprocess()
+        return self.aug
+
+    def augment_images(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        aug = self.get_aug()
+        # seeds are drawn from the main process random state in both serial and parallel modes,
+        # so results are reproducible and do not depend on LAYER_WORKERS
+        seeds = [int(seed) for seed in np.random.randint(0, 2**31 - 1, size=len(images))]
+        if not self.use_executor(images):
+            return _augment_images(aug, images, seeds)
+        # imagecorruptions ops are mostly pure python, so chunks are sent to worker processes
+        chunks = np.array_split(np.arange(len(images)), min(g.LAYER_WORKERS, len(images)))
+        executor = get_executor(self.executor_type)
+        futures = [
+            executor.submit(
+                _augment_images, aug, [images[i] for i in chunk], [seeds[i] for i in chunk]
+            )
+            for chunk in chunks
+        ]
+        return [img for future in futures for img in future.result()]
+
+    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
+        for outputs in self.process_batch([data_el]):
+            yield from outputs
+
+    def process_batch(self, data_els: List[Tuple[ImageDescriptor, Annotation]]):
+        images = [img_desc.read_image().astype(np.uint8) for img_desc, _ in data_els]
+        res_images = self.augment_images(images)
+        yield tuple(
+            (img_desc.clone_with_item(res_img), ann)
+            for (img_desc, ann), res_img in zip(data_els, res_images)
+        )
+
+    def has_batch_processing(self):
+        return True
+
 
 class ImgAugCorruptlikeBlurLayer(ImgCorruptLikeLayer):
     action = "iaa_imgcorruptlike_blur"
+    options = {
+        "defocus_blur": iaa.imgcorruptlike.DefocusBlur,
+        "motion_blur": iaa.imgcorruptlike.MotionBlur,
+        "zoom_blur": iaa.imgcorruptlike.ZoomBlur,
+    }
 
     def __init__(self, config, net):
         ImgCorruptLikeLayer.__init__(self, config, net=net)
 
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
-        img_desc, ann = data_el
-
-        if self.settings["option"] == "defocus_blur":
-            aug = iaa.imgcorruptlike.DefocusBlur(severity=self.settings["severity"])
-        elif self.settings["option"] == "motion_blur":
-            aug = iaa.imgcorruptlike.MotionBlur(severity=self.settings["severity"])
-        elif self.settings["option"] == "zoom_blur":
-            aug = iaa.imgcorruptlike.ZoomBlur(severity=self.settings["severity"])
-
-        img = img_desc.read_image()
-        pixelated_img = aug.augment_image(img.astype(np.uint8))
-        new_img_desc = img_desc.clone_with_item(pixelated_img)
-        yield (new_img_desc, ann)
-
 
 class ImgAugCorruptlikeColorLayer(ImgCorruptLikeLayer):
     action = "iaa_imgcorruptlike_color"
+    options = {
+        "contrast": iaa.imgcorruptlike.Contrast,
+        "brightness": iaa.imgcorruptlike.Brightness,
+        "saturate": iaa.imgcorruptlike.Saturate,
+    }
 
     def __init__(self, config, net):
         ImgCorruptLikeLayer.__init__(self, config, net=net)
 
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
-        img_desc, ann = data_el
-
-        if self.settings["option"] == "contrast":
-            aug = iaa.imgcorruptlike.Contrast(severity=self.settings["severity"])
-        elif self.settings["option"] == "brightness":
-            aug = iaa.imgcorruptlike.Brightness(severity=self.settings["severity"])
-        elif self.settings["option"] == "saturate":
-            aug = iaa.imgcorruptlike.Saturate(severity=self.settings["severity"])
-
-        img = img_desc.read_image()
-        pixelated_img = aug.augment_image(img.astype(np.uint8))
-        new_img_desc = img_desc.clone_with_item(pixelated_img)
-        yield (new_img_desc, ann)
-
 
 class ImgAugCorruptlikeCompressionLayer(ImgCorruptLikeLayer):
     action = "iaa_imgcorruptlike_compression"
+    options = {
+        "jpeg_compression": iaa.imgcorruptlike.JpegCompression,
+        "pixelate": iaa.imgcorruptlike.Pixelate,
+        "elastic_transform": iaa.imgcorruptlike.ElasticTransform,
+    }
 
     def __init__(self, config, net):
         ImgCorruptLikeLayer.__init__(self, config, net=net)
 
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
-        img_desc, ann = data_el
-        if self.settings["option"] == "jpeg_compression":
-            aug = iaa.imgcorruptlike.JpegCompression(severity=self.settings["severity"])
-        elif self.settings["option"] == "pixelate":
-            aug = iaa.imgcorruptlike.Pixelate(severity=self.settings["severity"])
-        elif self.settings["option"] == "elastic_transform":
-            aug = iaa.imgcorruptlike.ElasticTransform(severity=self.settings["severity"])
-        img = img_desc.read_image()
-        pixelated_img = aug.augment_image(img.astype(np.uint8))
-        new_img_desc = img_desc.clone_with_item(pixelated_img)
-        yield (new_img_desc, ann)
-
 
 class ImgAugCorruptlikeNoiseLayer(ImgCorruptLikeLayer):
     action = "iaa_imgcorruptlike_noise"
+    options = {
+        "gaussian_noise": iaa.imgcorruptlike.GaussianNoise,
+        "shot_noise": iaa.imgcorruptlike.ShotNoise,
+        "impulse_noise": iaa.imgcorruptlike.ImpulseNoise,
+        "speckle_noise": iaa.imgcorruptlike.SpeckleNoise,
+    }
 
     def __init__(self, config, net):
         ImgCorruptLikeLayer.__init__(self, config, net=net)
 
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
-        img_desc, ann = data_el
-
-        if self.settings["option"] == "gaussian_noise":
-            aug = iaa.imgcorruptlike.GaussianNoise(severity=self.settings["severity"])
-        elif self.settings["option"] == "shot_noise":
-            aug = iaa.imgcorruptlike.ShotNoise(severity=self.settings["severity"])
-        elif self.settings["option"] == "impulse_noise":
-            aug = iaa.imgcorruptlike.ImpulseNoise(severity=self.settings["severity"])
-        elif self.settings["option"] == "speckle_noise":
-            aug = iaa.imgcorruptlike.SpeckleNoise(severity=self.settings["severity"])
-
-        img = img_desc.read_image()
-        pixelated_img = aug.augment_image(img.astype(np.uint8))
-        new_img_desc = img_desc.clone_with_item(pixelated_img)
-        yield (new_img_desc, ann)
-
 
 class ImgAugCorruptlikeWeatherLayer(ImgCorruptLikeLayer):
     action = "iaa_imgcorruptlike_weather"
+    options = {
+        "fog": iaa.imgcorruptlike.Fog,
+        "frost": iaa.imgcorruptlike.Frost,
+        "snow": iaa.imgcorruptlike.Snow,
+        "spatter": iaa.imgcorruptlike.Spatter,
+    }
 
     def __init__(self, config, net):
         ImgCorruptLikeLayer.__init__(self, config, net=net)
-
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
-        img_desc, ann = data_el
-
-        if self.settings["option"] == "fog":
-            aug = iaa.imgcorruptlike.Fog(severity=self.settings["severity"])
-        elif self.settings["option"] == "frost":
-            aug = iaa.imgcorruptlike.Frost(severity=self.settings["severity"])
-        elif self.settings["option"] == "snow":
-            aug = iaa.imgcorruptlike.Snow(severity=self.settings["severity"])
-        elif self.settings["option"] == "spatter":
-            aug = iaa.imgcorruptlike.Spatter(severity=self.settings["severity"])
-
-        img = img_desc.read_image()
-        pixelated_img = aug.augment_image(img.astype(np.uint8))
-        new_img_desc = img_desc.clone_with_item(pixelated_img)
-        yield (new_img_desc, ann)
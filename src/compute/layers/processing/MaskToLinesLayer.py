@@ -18,22 +18,27 @@ from src.exceptions import WrongGeometryError
 # @TODO: check, it may be dirty
 
 
+# already scanned neighbours of a pixel in row-major order: up-left, up, up-right, left
+_PREV_NEIGHBOURS = np.array([(-1, -1), (-1, 0), (-1, 1), (0, -1)])
+
+
 def _get_graph(skel):
+    # nodes and edges are added in the same order as a row-major scan over pixels would add them,
+    # so traversal order of the graph (and resulting lines) does not depend on this implementation
     h, w = skel.shape
+    rows, cols = np.nonzero(skel)
     G = nx.Graph()
-    for i in range(0, h):
-        for j in range(0, w):
-            if skel[i, j] == 0:
-                continue
-            G.add_node((i, j))
-            if i - 1 >= 0 and j - 1 >= 0 and skel[i - 1, j - 1] == 1:
-                G.add_edge((i - 1, j - 1), (i, j))
-            if i - 1 >= 0 and skel[i - 1, j] == 1:
-                G.add_edge((i - 1, j), (i, j))
-            if i - 1 >= 0 and j + 1 < w and skel[i - 1, j + 1] == 1:
-                G.add_edge((i - 1, j + 1), (i, j))
-            if j - 1 >= 0 and skel[i, j - 1] == 1:
-                G.add_edge((i, j - 1), (i, j))
+    G.add_nodes_from(zip(rows.tolist(), cols.tolist()))
+
+    padded = np.zeros((h + 2, w + 2), dtype=bool)
+    padded[1:-1, 1:-1] = skel == 1
+    has_neighbour = padded[
+        rows[:, None] + 1 + _PREV_NEIGHBOURS[:, 0], cols[:, None] + 1 + _PREV_NEIGHBOURS[:, 1]
+    ]
+    pixel_idxs, neighbour_idxs = np.nonzero(has_neighbour)
+    dst = np.stack([rows[pixel_idxs], cols[pixel_idxs]], axis=1)
+    src = dst + _PREV_NEIGHBOURS[neighbour_idxs]
+    G.add_edges_from(zip(map(tuple, src.tolist()), map(tuple, dst.tolist())))
 
     return G
 
@@ -13,6 +13,7 @@ from supervisely.aug.imgaug_utils import apply as apply_augs
 
 class PerspectiveTransformLayer(Layer):
     action = "perspective_transform"
+    executor_type = "process"
 
     layer_settings = {
         "required": ["settings"],
@@ -2,7 +2,8 @@
 
 from typing import Tuple
 import numpy as np
-from supervisely import Bitmap, Annotation, Label, ObjClass, ProjectMeta
+from scipy.ndimage import find_objects
+from supervisely import Bitmap, Annotation, Label, ObjClass, PointLocation, ProjectMeta
 
 from src.compute.Layer import Layer
 from src.compute.classes_utils import ClassConstants
@@ -21,14 +22,20 @@ def convert_to_nonoverlapping(src_ann: Annotation, project_meta: ProjectMeta, cl
             new_labels.append(lbl)
             # non_rasterized_labels.append(lbl)
 
+    # bounding boxes of all label ids in one pass, masks are extracted only within them
+    label_slices = find_objects(common_img)
     for idx, lbl in enumerate(src_ann.labels, start=1):
+        if idx > len(label_slices) or label_slices[idx - 1] is None:
+            continue
         new_cls = project_meta.obj_classes.get(lbl.obj_class.name)
         new_lbls = lbl.convert(new_cls)
-        mask = common_img == idx
+        rows_slice, cols_slice = label_slices[idx - 1]
+        mask = common_img[rows_slice, cols_slice] == idx
         if np.any(mask):
             g = lbl.geometry
             new_bmp = Bitmap(
-                data=mask,           
+                data=mask,
+                origin=PointLocation(row=rows_slice.start, col=cols_slice.start),
                 labeler_login=g.labeler_login,
                 updated_at=g.updated_at,
                 created_at=g.created_at
@@ -1,17 +1,61 @@
 # coding: utf-8
 
-from typing import Tuple
+from typing import Tuple, Union
 import numpy as np
-from supervisely import Annotation
+from supervisely import Annotation, FrameCollection, VideoAnnotation
 from supervisely.aug.aug import resize
 
 from src.compute.Layer import Layer
-from src.compute.dtl_utils.item_descriptor import ImageDescriptor
+from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
 from src.exceptions import BadSettingsError
 
 
+def get_result_hw(img_hw: Tuple[int, int], set_hw: Tuple[int, int]) -> Tuple[int, int]:
+    src_h, src_w = img_hw
+    set_h, set_w = set_hw
+    new_h, new_w = set_h, set_w
+    if set_h == -1:
+        scale = set_w / src_w
+        new_h = int(round(src_h * scale))
+        new_w = set_w
+    elif set_w == -1:
+        scale = set_h / src_h
+        new_h = set_h
+        new_w = int(round(src_w * scale))
+    return new_h, new_w
+
+
+def get_resize_hw(img_hw: Tuple[int, int], set_hw: Tuple[int, int], keep: bool) -> Tuple[int, int]:
+    src_h, src_w = img_hw
+    set_h, set_w = set_hw
+    new_h, new_w = set_h, set_w
+    if keep:
+        if set_h == -1:
+            scale = set_w / src_w
+            new_h = int(round(src_h * scale))
+            new_w = set_w
+        elif set_w == -1:
+            scale = set_h / src_h
+            new_h = set_h
+            new_w = int(round(src_w * scale))
+        else:
+            scale_h = set_h / src_h
+            scale_w = set_w / src_w
+            if scale_h < scale_w:
+                scale = scale_h
+                new_h = set_h
+                new_w = int(round(src_w * scale))
+            else:
+                scale = scale_w
+                new_h = int(round(src_h * scale))
+                new_w = set_w
+
+    return new_h, new_w
+
+
 class ResizeLayer(Layer):
     action = "resize"
+    executor_type = "thread"
 
     layer_settings = {
         "required": ["settings"],
@@ -55,57 +99,42 @@ class ResizeLayer(Layer):
     def modifies_data(self):
         return True
 
-    def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
+    def resize_video_ann(self, ann: VideoAnnotation) -> VideoAnnotation:
+        # same geometry transforms as for the frames: resize, then shift to the center
+        keep = self.settings["aspect_ratio"]["keep"]
+        set_size_hw = (self.settings["height"], self.settings["width"])
+        resize_hw = get_resize_hw(ann.img_size, set_size_hw, keep)
+        result_hw = get_result_hw(resize_hw, set_size_hw)
+        shift_y, shift_x = (result_hw[0] - resize_hw[0]) // 2, (result_hw[1] - resize_hw[1]) // 2
+
+        frames = []
+        for frame in ann.frames:
+            figures = [
+                figure.clone(
+                    geometry=figure.geometry.resize(ann.img_size, resize_hw).translate(
+                        shift_y, shift_x
+                    )
+                )
+                for figure in frame.figures
+            ]
+            frames.append(frame.clone(figures=figures))
+        return ann.clone(img_size=result_hw, frames=FrameCollection(frames))
+
+    def process(
+        self,
+        data_el: Tuple[Union[ImageDescriptor, VideoDescriptor], Union[Annotation, VideoAnnotation]],
+    ):
         img_desc, ann = data_el
+        if isinstance(img_desc, VideoDescriptor):
+            yield self.process_video_frames(data_el, self.resize_video_ann(ann))
+            return
+
         img_hw = ann.img_size
         img = img_desc.read_image()
 
         keep = self.settings["aspect_ratio"]["keep"]
         set_size_hw = (self.settings["height"], self.settings["width"])
 
-        def get_result_hw(img_hw: Tuple[int, int], set_hw: Tuple[int, int]) -> Tuple[int, int]:
-            src_h, src_w = img_hw
-            set_h, set_w = set_hw
-            new_h, new_w = set_h, set_w
-            if set_h == -1:
-                scale = set_w / src_w
-                new_h = int(round(src_h * scale))
-                new_w = set_w
-            elif set_w == -1:
-                scale = set_h / src_h
-                new_h = set_h
-                new_w = int(round(src_w * scale))
-            return new_h, new_w
-
-        def get_resize_hw(
-            img_hw: Tuple[int, int], set_hw: Tuple[int, int], keep: bool
-        ) -> Tuple[int, int]:
-            src_h, src_w = img_hw
-            set_h, set_w = set_hw
-            new_h, new_w = set_h, set_w
-            if keep:
-                if set_h == -1:
-                    scale = set_w / src_w
-                    new_h = int(round(src_h * scale))
-                    new_w = set_w
-                elif set_w == -1:
-                    scale = set_h / src_h
-                    new_h = set_h
-                    new_w = int(round(src_w * scale))
-                else:
-                    scale_h = set_h / src_h
-                    scale_w = set_w / src_w
-                    if scale_h < scale_w:
-                        scale = scale_h
-                        new_h = set_h
-                        new_w = int(round(src_w * scale))
-                    else:
-                        scale = scale_w
-                        new_h = int(round(src_h * scale))
-                        new_w = set_w
-
-            return new_h, new_w
-
         def _get_res_image_shape(result_hw, img):
             if len(img.shape) > 2:
                 return (*result_hw, img.shape[2])
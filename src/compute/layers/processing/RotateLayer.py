@@ -14,6 +14,7 @@ from src.exceptions import BadSettingsError
 
 class RotateLayer(Layer):
     action = "rotate"
+    executor_type = "process"
 
     layer_settings = {
         "required": ["settings"],
@@ -6,17 +6,16 @@ from supervisely.io.fs import get_file_name
 from supervisely import (
     Annotation,
     VideoAnnotation,
-    KeyIdMap,
     ProjectMeta,
     DatasetInfo,
     TagValueType,
     TagMetaCollection,
 )
-import supervisely.io.fs as sly_fs
-import supervisely.io.json as sly_json
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
 from src.compute.Layer import Layer
-from src.exceptions import GraphError
+from src.utils import get_ds_parents, upload_images, upload_videos
+from src.compute.utils.uploader import BackgroundUploader
+from src.exceptions import CustomException, GraphError
 import src.globals as g
 from supervisely.io.fs import get_file_ext
 
@@ -48,6 +47,7 @@ class AddToExistingProjectLayer(Layer):
         Layer.__init__(self, config, net=net)
         self.sly_project_info = None
         self.ds_map = {}
+        self.uploader = BackgroundUploader(g.UPLOAD_WORKERS, g.UPLOAD_MAX_IN_FLIGHT)
 
     def validate(self):
         if self.net.preview_mode:
@@ -146,19 +146,6 @@ class AddToExistingProjectLayer(Layer):
                     existing_names
                 )
 
-    def get_ds_parents(self, dataset_info: DatasetInfo):
-        if dataset_info is None:
-            return None
-        ds_parents = None
-        for parents, dataset in g.api.dataset.tree(dataset_info.project_id):
-            if dataset.name == dataset_info.name:
-                ds_parents = parents
-                break
-        if len(ds_parents) == 0:
-            return None
-        else:
-            return ds_parents
-
     def get_or_create_nested_dataset(self, dataset_name, ds_parents):
         # @TODO: create project with change_name_if_conflict=True
         parent_id = self.sly_project_info.id
@@ -266,40 +253,20 @@ class AddToExistingProjectLayer(Layer):
                         for item_desc in item_descs
                     ]
                     if self.net.modality == "images":
-                        if self.net.may_require_items():
-                            image_info = g.api.image.upload_nps(
-                                dataset_info.id,
-                                out_item_names,
-                                [item_desc.read_image() for item_desc in item_descs],
-                            )
-                        else:
-                            image_info = g.api.image.upload_ids(
-                                dataset_info.id,
-                                out_item_names,
-                                [item_desc.info.item_info.id for item_desc in item_descs],
-                            )
-
-                        new_item_ids = [image_info.id for image_info in image_info]
-                        g.api.annotation.upload_anns(new_item_ids, anns)
+                        self.uploader.submit(
+                            upload_images, dataset_info.id, out_item_names, item_descs, anns
+                        )
                     elif self.net.modality == "videos":
-                        video_info = g.api.video.upload_paths(
-                            dataset_info.id, out_item_names, item_desc.item_data
+                        upload_videos(
+                            dataset_info.id, out_item_names, item_descs, anns, self.output_meta
                         )
-                        ann_paths = [f"{item_desc.item_data}.json" for item_desc in item_descs]
-                        for ann_path in ann_paths:
-                            if not sly_fs.file_exists(ann_path):
-                                ann_json = ann.to_json(KeyIdMap())
-                                sly_json.dump_json_file(ann_json, ann_path)
-                            g.api.video.annotation.upload_paths(
-                                [video_info.id], [ann_path], self.output_meta
-                            )
 
                 else:
                     for ds_name in ds_item_map:
                         orig_ds_info = ds_item_map[ds_name][0][
                             0
                         ].info.ds_info  # @TODO: not safe, fix later
-                        ds_parents = self.get_ds_parents(orig_ds_info)
+                        ds_parents = get_ds_parents(orig_ds_info)
                         dataset_info = self.get_or_create_dataset(ds_name, ds_parents)
                         dataset_name = dataset_info.name
 
@@ -312,48 +279,35 @@ class AddToExistingProjectLayer(Layer):
                         ]
 
                         if self.net.modality == "images":
-                            if self.net.may_require_items():
-                                image_nps = [
-                                    item_desc.read_image() for item_desc, _ in ds_item_map[ds_name]
-                                ]
-                                image_info = g.api.image.upload_nps(
-                                    dataset_info.id, out_item_names, image_nps
-                                )
-                            else:
-                                item_ids = [
-                                    item_desc.info.item_info.id
-                                    for item_desc, _ in ds_item_map[ds_name]
-                                ]
-                                image_info = g.api.image.upload_ids(
-                                    dataset_info.id, out_item_names, item_ids
-                                )
-                            anns = [ann for _, ann in ds_item_map[ds_name]]
-                            upload_ids = [info.id for info in image_info]
-                            g.api.annotation.upload_anns(upload_ids, anns)
+                            self.uploader.submit(
+                                upload_images,
+                                dataset_info.id,
+                                out_item_names,
+                                [item_desc for item_desc, _ in ds_item_map[ds_name]],
+                                [ann for _, ann in ds_item_map[ds_name]],
+                            )
                         elif self.net.modality == "videos":
-                            video_datas = [
-                                item_desc.item_data for item_desc, _ in ds_item_map[dataset_name]
-                            ]
-                            video_info = g.api.video.upload_paths(
-                                dataset_info.id, out_item_names, video_datas
+                            upload_videos(
+                                dataset_info.id,
+                                out_item_names,
+                                [item_desc for item_desc, _ in ds_item_map[ds_name]],
+                                [ann for _, ann in ds_item_map[ds_name]],
+                                self.output_meta,
                             )
 
-                            ann_paths = [
-                                f"{item_desc.item_data}.json"
-                                for item_desc, _ in ds_item_map[dataset_name]
-                            ]
-                            for ann_path in ann_paths:
-                                if not sly_fs.file_exists(ann_path):
-                                    ann_json = ann.to_json(KeyIdMap())
-                                    sly_json.dump_json_file(ann_json, ann_path)
-                                g.api.video.annotation.upload_paths(
-                                    [video_info.id], [ann_path], self.output_meta
-                                )
-
         yield data_els
 
     def has_batch_processing(self) -> bool:
         return True
 
     def postprocess(self):
+        try:
+            self.uploader.wait()
+        except Exception as e:
+            raise CustomException(
+                "Failed to upload some items", error=e, extra={"layer": self.action}
+            )
         self.postprocess_cb()
+
+    def cancel(self):
+        self.uploader.cancel()
@@ -2,11 +2,10 @@
 
 from typing import Tuple, Union, List
 from collections import defaultdict
-from supervisely import Annotation, VideoAnnotation, KeyIdMap, ProjectMeta, DatasetInfo
-import supervisely.io.fs as sly_fs
-import supervisely.io.json as sly_json
+from supervisely import Annotation, VideoAnnotation, ProjectMeta
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
 from src.compute.Layer import Layer
+from src.utils import get_ds_parents, upload_images, upload_videos
 from src.exceptions import BadSettingsError
 from supervisely.io.fs import get_file_ext
 import src.globals as g
@@ -193,17 +192,6 @@ class CreateLabelingJobLayer(Layer):
             self.sly_project_info = g.api.project.get_info_by_id(project_id, self.net.modality)
             # need custom data update?
 
-    def get_ds_parents(self, dataset_info: DatasetInfo):
-        ds_parents = None
-        for parents, dataset in g.api.dataset.tree(dataset_info.project_id):
-            if dataset.name == dataset_info.name:
-                ds_parents = parents
-                break
-        if len(ds_parents) == 0:
-            return None
-        else:
-            return ds_parents
-
     def get_or_create_nested_dataset(self, dataset_name, ds_parents):
         parent_id = self.sly_project_info.id
         for parent_name in ds_parents:
@@ -248,26 +236,13 @@ class CreateLabelingJobLayer(Layer):
                 if self.settings["create_new_project"]:
                     dataset_info = self.get_or_create_dataset(dataset_name)
                     if self.net.modality == "images":
-                        if self.net.may_require_items():
-                            item_info = g.api.image.upload_np(
-                                dataset_info.id, out_item_name, item_desc.read_image()
-                            )
-                        else:
-                            item_info = g.api.image.upload_id(
-                                dataset_info.id, out_item_name, item_desc.info.item_info.id
-                            )
-                        g.api.annotation.upload_ann(item_info.id, ann)
+                        item_info = upload_images(
+                            dataset_info.id, [out_item_name], [item_desc], [ann]
+                        )[0]
                     elif self.net.modality == "videos":
-                        item_info = g.api.video.upload_path(
-                            dataset_info.id, out_item_name, item_desc.item_data
-                        )
-                        ann_path = f"{item_desc.item_data}.json"
-                        if not sly_fs.file_exists(ann_path):
-                            ann_json = ann.to_json(KeyIdMap())
-                            sly_json.dump_json_file(ann_json, ann_path)
-                        g.api.video.annotation.upload_paths(
-                            [item_info.id], [ann_path], self.output_meta
-                        )
+                        item_info = upload_videos(
+                            dataset_info.id, [out_item_name], [item_desc], [ann], self.output_meta
+                        )[0]
                     self._labeling_job_map[dataset_info.id].append(item_info.id)
                 else:
                     self._labeling_job_map[item_desc.info.item_info.dataset_id].append(
@@ -311,54 +286,23 @@ class CreateLabelingJobLayer(Layer):
                         ]
                         # @TODO: not safe, fix later
                         orig_ds_info = ds_item_map[dataset_name][0][0].info.ds_info
-                        ds_parents = self.get_ds_parents(orig_ds_info)
+                        ds_parents = get_ds_parents(orig_ds_info)
                         dataset_info = self.get_or_create_dataset(dataset_name, ds_parents)
                         if self.net.modality == "images":
-                            if self.net.may_require_items():
-                                item_infos = g.api.image.upload_nps(
-                                    dataset_info.id,
-                                    out_item_names,
-                                    [
-                                        item_desc.read_image()
-                                        for item_desc, _ in ds_item_map[dataset_name]
-                                    ],
-                                )
-                            else:
-                                item_infos = g.api.image.upload_ids(
-                                    dataset_info.id,
-                                    out_item_names,
-                                    [
-                                        item_desc.info.item_info.id
-                                        for item_desc, _ in ds_item_map[dataset_name]
-                                    ],
-                                )
-
-                            # @TODO: BATCH UPLOAD
-                            # for item_info, (_, ann) in zip(item_infos, ds_item_map[dataset_name]):
-                            #     g.api.annotation.upload_ann(item_info.id, ann)
-                            g.api.annotation.upload_anns(
-                                [item_info.id for item_info in item_infos],
+                            item_infos = upload_images(
+                                dataset_info.id,
+                                out_item_names,
+                                [item_desc for item_desc, _ in ds_item_map[dataset_name]],
                                 [ann for _, ann in ds_item_map[dataset_name]],
                             )
                         elif self.net.modality == "videos":
-                            item_infos = g.api.video.upload_paths(
+                            item_infos = upload_videos(
                                 dataset_info.id,
                                 out_item_names,
-                                [item_desc.item_data for item_desc, _ in ds_item_map[dataset_name]],
+                                [item_desc for item_desc, _ in ds_item_map[dataset_name]],
+                                [ann for _, ann in ds_item_map[dataset_name]],
+                                self.output_meta,
                             )
-                            ann_paths = [
-                                f"{item_desc.item_data}.json"
-                                for item_desc, _ in ds_item_map[dataset_name]
-                            ]
-                            for ann, ann_path, video_info in zip(
-                                [ann for _, ann in ds_item_map[dataset_name]], ann_paths, item_infos
-                            ):
-                                if not sly_fs.file_exists(ann_path):
-                                    ann_json = ann.to_json(KeyIdMap())
-                                    sly_json.dump_json_file(ann_json, ann_path)
-                                g.api.video.annotation.upload_paths(
-                                    [video_info.id], [ann_path], self.output_meta
-                                )
                         item_ids = [image_info.id for image_info in item_infos]
                         self._labeling_job_map[dataset_info.id].extend(item_ids)
                 else:
@@ -372,7 +316,7 @@ class CreateLabelingJobLayer(Layer):
                     for dataset_name in ds_map:
                         # @TODO: not safe, fix later
                         orig_ds_info = ds_map[dataset_name][0][0].info.ds_info
-                        ds_parents = self.get_ds_parents(orig_ds_info)
+                        ds_parents = get_ds_parents(orig_ds_info)
                         dataset_info = self.get_or_create_dataset(dataset_name, ds_parents)
                         item_ids = [
                             item_desc.info.item_info.id for item_desc, _ in ds_map[dataset_name]
@@ -1,11 +1,10 @@
 # coding: utf-8
 from typing import Tuple, Union, List
 
-from supervisely import Annotation, VideoAnnotation, KeyIdMap, DatasetInfo
-import supervisely.io.fs as sly_fs
-import supervisely.io.json as sly_json
+from supervisely import Annotation, VideoAnnotation
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
 from src.compute.Layer import Layer
+from src.utils import get_ds_parents, upload_images, upload_videos
 from src.exceptions import GraphError
 import src.globals as g
 from supervisely.io.fs import get_file_ext
@@ -82,19 +81,6 @@ class CreateNewProjectLayer(Layer):
         }
         g.api.project.update_custom_data(self.sly_project_info.id, custom_data)
 
-    def get_ds_parents(self, dataset_info: DatasetInfo):
-        if dataset_info is None:
-            return None
-        ds_parents = None
-        for parents, dataset in g.api.dataset.tree(dataset_info.project_id):
-            if dataset.name == dataset_info.name:
-                ds_parents = parents
-                break
-        if len(ds_parents) == 0:
-            return None
-        else:
-            return ds_parents
-
     def get_or_create_nested_dataset(self, dataset_name, ds_parents):
         parent_id = self.sly_project_info.id
         for parent_name in ds_parents:
@@ -136,7 +122,7 @@ class CreateNewProjectLayer(Layer):
                 if self.sly_project_info is not None:
                     # @TODO: not safe, fix later
                     orig_ds_info = ds_item_map[ds_name][0][0].info.ds_info
-                    ds_parents = self.get_ds_parents(orig_ds_info)
+                    ds_parents = get_ds_parents(orig_ds_info)
                     dataset_info = self.get_or_create_dataset(ds_name, ds_parents)
 
                     out_item_names = [
@@ -147,44 +133,21 @@ class CreateNewProjectLayer(Layer):
                         for item_desc, _ in ds_item_map[ds_name]
                     ]
                     if self.net.modality == "images":
-                        if self.net.may_require_items():
-                            item_infos = g.api.image.upload_nps(
-                                dataset_info.id,
-                                out_item_names,
-                                [item_desc.read_image() for item_desc, _ in ds_item_map[ds_name]],
-                            )
-                        else:
-                            item_infos = g.api.image.upload_ids(
-                                dataset_info.id,
-                                out_item_names,
-                                [
-                                    item_desc.info.item_info.id
-                                    for item_desc, _ in ds_item_map[ds_name]
-                                ],
-                            )
-                        g.api.annotation.upload_anns(
-                            [item_info.id for item_info in item_infos],
+                        upload_images(
+                            dataset_info.id,
+                            out_item_names,
+                            [item_desc for item_desc, _ in ds_item_map[ds_name]],
                             [ann for _, ann in ds_item_map[ds_name]],
                         )
 
                     elif self.net.modality == "videos":
-                        item_infos = g.api.video.upload_paths(
+                        upload_videos(
                             dataset_info.id,
                             out_item_names,
-                            [item_desc.item_data for item_desc, _ in ds_item_map[ds_name]],
+                            [item_desc for item_desc, _ in ds_item_map[ds_name]],
+                            [ann for _, ann in ds_item_map[ds_name]],
+                            self.output_meta,
                         )
-                        ann_paths = [
-                            f"{item_desc.item_data}.json" for item_desc, _ in ds_item_map[ds_name]
-                        ]
-                        for ann, ann_path, video_info in zip(
-                            [ann for _, ann in ds_item_map[ds_name]], ann_paths, item_infos
-                        ):
-                            if not sly_fs.file_exists(ann_path):
-                                ann_json = ann.to_json(KeyIdMap())
-                                sly_json.dump_json_file(ann_json, ann_path)
-                            g.api.video.annotation.upload_paths(
-                                [video_info.id], [ann_path], self.output_meta
-                            )
             yield tuple(zip(item_descs, anns))
 
     def has_batch_processing(self):
@@ -17,17 +17,20 @@ from supervisely import (
     Bitmap,
     Polygon,
     KeyIdMap,
-    DatasetInfo,
     logger,
 )
 from src.compute.utils import imaging
 from src.compute.utils import os_utils
+from src.compute.utils.executors import get_executor
+from src.compute.utils.tar_stream import TarStreamWriter
+from supervisely.imaging import image as sly_image
 from supervisely.imaging.color import random_rgb
 import supervisely.io.json as sly_json
 import supervisely.io.fs as sly_fs
 
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor, VideoDescriptor
 from src.compute.Layer import Layer
+from src.utils import get_ds_parents
 from src.exceptions import GraphError, BadSettingsError
 import src.globals as g
 
@@ -47,6 +50,7 @@ class ExportArchiveLayer(Layer):
                     "images": {"type": "boolean"},  # Deprecated
                     "annotations": {"type": "boolean"},  # Deprecated
                     "visualize": {"type": "boolean"},
+                    "streaming": {"type": "boolean"},
                 },
             }
         },
@@ -73,6 +77,8 @@ class ExportArchiveLayer(Layer):
     def __init__(self, config, output_folder, net):
         Layer.__init__(self, config, net=net)
         self.output_folder = output_folder
+        self.vis_cls_mapping = None
+        self.tar_writer = None
 
     def requires_item(self):
         return True
@@ -110,11 +116,20 @@ class ExportArchiveLayer(Layer):
 
         if self.net.modality == "images":
             dst = self.dsts[0]
-            self.out_project = Project(
-                directory=f"{self.output_folder}/{dst}", mode=OpenMode.CREATE
-            )
-            with open(self.out_project.directory + "/meta.json", "w") as f:
-                json.dump(self.output_meta.to_json(), f)
+            if self.settings.get("streaming", g.STREAM_ARCHIVES):
+                # project files are written directly to the archive
+                self.out_project_name = dst
+                self.tar_writer = TarStreamWriter(f"{self.output_folder}/{dst}.tar")
+                self.tar_writer.add_bytes(
+                    "meta.json", json.dumps(self.output_meta.to_json()).encode("utf-8")
+                )
+            else:
+                self.out_project = Project(
+                    directory=f"{self.output_folder}/{dst}", mode=OpenMode.CREATE
+                )
+                self.out_project_name = self.out_project.name
+                with open(self.out_project.directory + "/meta.json", "w") as f:
+                    json.dump(self.output_meta.to_json(), f)
 
             # Deprecate warning
             for param in ["images", "annotations"]:
@@ -131,18 +146,147 @@ class ExportArchiveLayer(Layer):
             with open(self.out_project.directory + "/meta.json", "w") as f:
                 json.dump(self.output_meta.to_json(), f)
 
-    def get_ds_parents(self, dataset_info: DatasetInfo):
-        if dataset_info is None:
-            return None
-        ds_parents = None
-        for parents, dataset in g.api.dataset.tree(dataset_info.project_id):
-            if dataset.name == dataset_info.name:
-                ds_parents = parents
-                break
-        if len(ds_parents) == 0:
-            return None
+    def get_vis_cls_mapping(self):
+        if self.vis_cls_mapping is None:
+            out_meta = self.output_meta
+            out_meta: ProjectMeta
+            cls_mapping = {}
+            for obj_class in out_meta.obj_classes:
+                color = obj_class.color
+                if color is None:
+                    color = random_rgb()
+                cls_mapping[obj_class.name] = color
+
+            # hack to draw 'black' regions
+            self.vis_cls_mapping = {
+                k: (1, 1, 1) if max(v) == 0 else v for k, v in cls_mapping.items()
+            }
+        return self.vis_cls_mapping
+
+    def prepare_image_item(self, item_desc: ImageDescriptor):
+        # allocates output name and dataset, must be called sequentially
+        free_name = self.get_free_name(
+            item_desc.get_item_name(), item_desc.get_ds_name(), self.out_project_name
+        )
+
+        orig_ds_info = item_desc.info.ds_info
+        new_dataset_name = item_desc.get_res_ds_name()
+
+        ds_parents = get_ds_parents(orig_ds_info)
+        if ds_parents is None:
+            nested_path = ""
         else:
-            return ds_parents
+            ds_parents_modified = [parent + "/datasets" for parent in ds_parents]
+            nested_path = osp.join(*ds_parents_modified)
+
+        out_item_name = free_name + item_desc.get_item_ext()
+        if self.tar_writer is not None:
+            # dataset is represented by its path in the archive
+            out_dataset = osp.join(nested_path, new_dataset_name)
+            vis_img_path = None
+            if self.settings.get("visualize"):
+                vis_img_path = osp.join(out_dataset, "visualize", free_name + ".png")
+            return out_dataset, out_item_name, vis_img_path
+
+        vis_img_path = None
+        if self.settings.get("visualize"):
+            vis_img_path = osp.join(
+                self.output_folder,
+                self.out_project.name,
+                nested_path,
+                new_dataset_name,
+                "visualize",
+                free_name + ".png",
+            )
+
+        out_dataset = None
+        if not self.out_project.datasets.has_key(new_dataset_name):
+            if ds_parents is not None:
+                nested_path = osp.join(nested_path, new_dataset_name)
+                out_dataset = self.out_project.create_dataset(new_dataset_name, nested_path)
+            else:
+                out_dataset = self.out_project.create_dataset(new_dataset_name)
+
+        if out_dataset is None:
+            out_dataset = self.out_project.datasets.get(new_dataset_name)
+        return out_dataset, out_item_name, vis_img_path
+
+    def write_image_item(
+        self,
+        item_desc: ImageDescriptor,
+        ann: Annotation,
+        out_dataset: Union[Dataset, str],
+        out_item_name: str,
+        vis_img_path: str = None,
+    ):
+        # encodes and writes item files, safe to run on worker threads
+        if vis_img_path is not None:
+            vis_img = self.draw_colored_mask(ann, self.get_vis_cls_mapping())
+            orig_img = item_desc.read_image()
+            comb_img = imaging.overlay_images(orig_img, vis_img, 0.5)
+
+            sep = np.array([[[0, 255, 0]]] * orig_img.shape[0], dtype=np.uint8)
+            img = np.hstack((orig_img, sep, comb_img))
+
+            if self.tar_writer is not None:
+                self.tar_writer.add_bytes(vis_img_path, sly_image.write_bytes(img, ".png"))
+            else:
+                img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+                os_utils.ensure_base_path(vis_img_path)
+                cv2.imwrite(vis_img_path, img)
+
+        if self.tar_writer is not None:
+            img_arcname = osp.join(out_dataset, "img", out_item_name)
+            if item_desc.need_write() and item_desc.item_data is not None:
+                img_bytes = sly_image.write_bytes(item_desc.item_data, item_desc.get_item_ext())
+                self.tar_writer.add_bytes(img_arcname, img_bytes)
+            else:
+                self.tar_writer.add_file(img_arcname, item_desc.get_item_path())
+            self.tar_writer.add_bytes(
+                osp.join(out_dataset, "ann", out_item_name + ".json"),
+                json.dumps(ann.to_json()).encode("utf-8"),
+            )
+            return
+
+        # net _always_ downloads images
+        if item_desc.need_write() and item_desc.item_data is not None:
+            out_dataset.add_item_np(out_item_name, item_desc.item_data, ann=ann)
+        else:
+            out_dataset.add_item_file(out_item_name, item_desc.get_item_path(), ann=ann)
+
+    def process_batch(self, data_els):
+        if self.net.preview_mode or self.net.modality != "images":
+            layer_outputs = []
+            for data_el in data_els:
+                layer_outputs.extend(self.process(data_el))
+            yield layer_outputs
+            return
+
+        if self.settings.get("visualize"):
+            self.get_vis_cls_mapping()  # build once before workers use it
+        write_jobs = [
+            (item_desc, ann, *self.prepare_image_item(item_desc)) for item_desc, ann in data_els
+        ]
+        if len(write_jobs) < 2 or g.LAYER_WORKERS < 2:
+            for job in write_jobs:
+                self.write_image_item(*job)
+        else:
+            executor = get_executor("thread")
+            futures = [executor.submit(self.write_image_item, *job) for job in write_jobs]
+            for future in futures:
+                future.result()
+        yield tuple(data_els)
+
+    def has_batch_processing(self):
+        return True
+
+    def postprocess(self):
+        if self.tar_writer is not None:
+            self.tar_writer.close()
+
+    def cancel(self):
+        if self.tar_writer is not None:
+            self.tar_writer.abort()
 
     def process(
         self,
@@ -152,80 +296,11 @@ class ExportArchiveLayer(Layer):
 
         if isinstance(ann, Annotation):
             if not self.net.preview_mode:
-                free_name = self.get_free_name(
-                    item_desc.get_item_name(), item_desc.get_ds_name(), self.out_project.name
-                )
-
-                orig_ds_info = item_desc.info.ds_info
-                new_dataset_name = item_desc.get_res_ds_name()
-
-                ds_parents = self.get_ds_parents(orig_ds_info)
-                if ds_parents is None:
-                    nested_path = ""
-                else:
-                    ds_parents_modified = [parent + "/datasets" for parent in ds_parents]
-                    nested_path = osp.join(*ds_parents_modified)
-
-                if self.settings.get("visualize"):
-                    out_meta = self.output_meta
-                    out_meta: ProjectMeta
-                    cls_mapping = {}
-                    for obj_class in out_meta.obj_classes:
-                        color = obj_class.color
-                        if color is None:
-                            color = random_rgb()
-                        cls_mapping[obj_class.name] = color
-
-                    # hack to draw 'black' regions
-                    cls_mapping = {
-                        k: (1, 1, 1) if max(v) == 0 else v for k, v in cls_mapping.items()
-                    }
-
-                    vis_img = self.draw_colored_mask(ann, cls_mapping)
-                    orig_img = item_desc.read_image()
-                    comb_img = imaging.overlay_images(orig_img, vis_img, 0.5)
-
-                    sep = np.array([[[0, 255, 0]]] * orig_img.shape[0], dtype=np.uint8)
-                    img = np.hstack((orig_img, sep, comb_img))
-
-                    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-                    # ds_parents_path = osp.join(*ds_parents) if ds_parents else ""
-
-                    output_img_path = osp.join(
-                        self.output_folder,
-                        self.out_project.name,
-                        nested_path,
-                        new_dataset_name,
-                        "visualize",
-                        free_name + ".png",
-                    )
-                    os_utils.ensure_base_path(output_img_path)
-                    cv2.imwrite(output_img_path, img)
-
-                out_dataset = None
-                if not self.out_project.datasets.has_key(new_dataset_name):
-                    if ds_parents is not None:
-                        nested_path = osp.join(nested_path, new_dataset_name)
-                        out_dataset = self.out_project.create_dataset(new_dataset_name, nested_path)
-                    else:
-                        out_dataset = self.out_project.create_dataset(new_dataset_name)
-
-                if out_dataset is None:
-                    out_dataset = self.out_project.datasets.get(new_dataset_name)
-                out_item_name = free_name + item_desc.get_item_ext()
-
-                # net _always_ downloads images
-                if item_desc.need_write() and item_desc.item_data is not None:
-                    out_dataset: Dataset
-                    out_dataset.add_item_np(out_item_name, item_desc.item_data, ann=ann)
-                else:
-                    out_dataset.add_item_file(out_item_name, item_desc.get_item_path(), ann=ann)
+                self.write_image_item(item_desc, ann, *self.prepare_image_item(item_desc))
         else:
             free_name = self.get_free_name(
                 item_desc.get_item_name(), item_desc.get_ds_name(), self.out_project.name
             )
-            new_dataset_name = item_desc.get_res_ds_name()
-
             dataset_name = item_desc.get_res_ds_name()
             if not self.out_project.datasets.has_key(dataset_name):
                 self.out_project.create_dataset(dataset_name)
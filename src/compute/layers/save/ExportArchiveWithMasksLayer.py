@@ -7,10 +7,13 @@ import os.path as osp
 import cv2
 import numpy as np
 
-from supervisely import Annotation, DatasetInfo, Project, Dataset, logger, OpenMode
+from supervisely import Annotation, Project, Dataset, logger, OpenMode
+from supervisely.imaging import image as sly_image
 
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor
 from src.compute.Layer import Layer
+from src.compute.utils.tar_stream import TarStreamWriter
+from src.utils import get_ds_parents
 from src.exceptions import GraphError, BadSettingsError
 
 import src.globals as g
@@ -47,6 +50,7 @@ class ExportArchiveWithMasksLayer(Layer):
                     "annotations": {"type": "boolean"},  # Deprecated
                     "masks_machine": {"type": "boolean"},
                     "masks_human": {"type": "boolean"},
+                    "streaming": {"type": "boolean"},
                 },
             }
         },
@@ -77,6 +81,7 @@ class ExportArchiveWithMasksLayer(Layer):
         Layer.__init__(self, config, net=net)
 
         self.output_folder = output_folder
+        self.tar_writer = None
 
     def requires_item(self):
         # res = self.settings['masks_human'] is True  # don't use img otherwise
@@ -124,19 +129,6 @@ class ExportArchiveWithMasksLayer(Layer):
     def modifies_data(self):
         return False
 
-    def get_ds_parents(self, dataset_info: DatasetInfo):
-        if dataset_info is None:
-            return None
-        ds_parents = None
-        for parents, dataset in g.api.dataset.tree(dataset_info.project_id):
-            if dataset.name == dataset_info.name:
-                ds_parents = parents
-                break
-        if len(ds_parents) == 0:
-            return None
-        else:
-            return ds_parents
-
     def preprocess(self):
         if self.net.preview_mode:
             return
@@ -152,9 +144,20 @@ class ExportArchiveWithMasksLayer(Layer):
             # raise GraphError(
             # "Destination is not set", extra={"layer_config": self.config, "layer": self.action}
             # )
-        self.out_project = Project(directory=f"{self.output_folder}/{dst}", mode=OpenMode.CREATE)
-        with open(self.out_project.directory + "/meta.json", "w") as f:
-            json.dump(self.output_meta.to_json(), f)
+        if self.settings.get("streaming", g.STREAM_ARCHIVES):
+            # project files are written directly to the archive
+            self.out_project_name = dst
+            self.tar_writer = TarStreamWriter(f"{self.output_folder}/{dst}.tar")
+            self.tar_writer.add_bytes(
+                "meta.json", json.dumps(self.output_meta.to_json()).encode("utf-8")
+            )
+        else:
+            self.out_project = Project(
+                directory=f"{self.output_folder}/{dst}", mode=OpenMode.CREATE
+            )
+            self.out_project_name = self.out_project.name
+            with open(self.out_project.directory + "/meta.json", "w") as f:
+                json.dump(self.output_meta.to_json(), f)
 
         # Deprecate warning
         for param in ["images", "annotations"]:
@@ -163,16 +166,36 @@ class ExportArchiveWithMasksLayer(Layer):
                     "'save_masks' layer: '{}' parameter is deprecated. Skipped.".format(param)
                 )
 
+    def write_to_archive(
+        self, item_desc: ImageDescriptor, ann: Annotation, ds_path: str, free_name: str
+    ):
+        out_item_name = free_name + item_desc.get_item_ext()
+        img_arcname = osp.join(ds_path, "img", out_item_name)
+        # net _always_ downloads images
+        if item_desc.need_write() and item_desc.item_data is not None:
+            img_bytes = sly_image.write_bytes(item_desc.item_data, item_desc.get_item_ext())
+            self.tar_writer.add_bytes(img_arcname, img_bytes)
+        else:
+            self.tar_writer.add_file(img_arcname, item_desc.get_item_path())
+        self.tar_writer.add_bytes(
+            osp.join(ds_path, "ann", out_item_name + ".json"),
+            json.dumps(ann.to_json()).encode("utf-8"),
+        )
+
+    def postprocess(self):
+        if self.tar_writer is not None:
+            self.tar_writer.close()
+
     def process(self, data_el: Tuple[ImageDescriptor, Annotation]):
         item_desc, ann = data_el
         if not self.net.preview_mode:
             free_name = self.get_free_name(
-                item_desc.get_item_name(), item_desc.get_ds_name(), self.out_project.name
+                item_desc.get_item_name(), item_desc.get_ds_name(), self.out_project_name
             )
 
             orig_ds_info = item_desc.info.ds_info
             new_dataset_name = item_desc.get_res_ds_name()
-            ds_parents = self.get_ds_parents(orig_ds_info)
+            ds_parents = get_ds_parents(orig_ds_info)
             if ds_parents is None:
                 nested_path = ""
             else:
@@ -199,6 +222,13 @@ class ExportArchiveWithMasksLayer(Layer):
                     sep = np.array([[[0, 255, 0]]] * orig_img.shape[0], dtype=np.uint8)
                     img = np.hstack((orig_img, sep, comb_img))
 
+                if self.tar_writer is not None:
+                    self.tar_writer.add_bytes(
+                        osp.join(nested_path, new_dataset_name, out_dir, free_name + ".png"),
+                        sly_image.write_bytes(img, ".png"),
+                    )
+                    continue
+
                 img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
                 output_img_path = osp.join(
                     self.out_project.directory,
@@ -220,6 +250,13 @@ class ExportArchiveWithMasksLayer(Layer):
 
                 cv2.imwrite(output_img_path, img)
 
+            if self.tar_writer is not None:
+                self.write_to_archive(
+                    item_desc, ann, osp.join(nested_path, new_dataset_name), free_name
+                )
+                yield ([item_desc, ann])
+                return
+
             out_dataset = None
             if not self.out_project.datasets.has_key(new_dataset_name):
                 if ds_parents is not None:
@@ -11,6 +11,8 @@ from supervisely.sly_logger import logger, EventType
 from src.compute.dtl_utils.dtl_helper import DtlHelper, DtlPaths
 from src.compute.tasks import task_helpers
 from src.compute.utils import logging_utils
+from src.compute.utils.net_pool import NetWorkerPool
+from src.compute.utils.stat_timer import TinyTimer, global_timer
 from src.compute.Net import Net
 from src.exceptions import CustomException, GraphError
 from src.utils import LegacyProjectItem
@@ -74,6 +76,10 @@ def main(
         return
 
     logger.info("Pipeline started")
+    # stats of previous runs and previews are not included in the run summary
+    global_timer.reset()
+    # dataset hierarchies are indexed once per run
+    g.cache["ds_parents"].clear()
     helper = DtlHelper()
 
     try:
@@ -146,52 +152,77 @@ def main(
     if not g.pipeline_running:
         return
 
+    pool = None
+    if g.EXECUTION_MODE == "parallel" and modality == "images" and g.NET_WORKERS > 1:
+        logger.info(f"Processing layers will be run in {g.NET_WORKERS} worker processes")
+        pool = NetWorkerPool(helper.graph, helper.paths.results_dir, modality, g.NET_WORKERS)
+        # (batch size, getter of the batches reaching save layers) are yielded
+        batches = pool.imap(elements_generator_batched, ordered=g.NET_WORKERS_ORDERED)
+    else:
+        batches = ((len(data_batch), data_batch) for data_batch in elements_generator_batched)
+
     results_counter = 0
     processing_time_start = time()
-    with progress(message=f"Processing items...", total=total) as pbar:
-        for data_batch in elements_generator_batched:
-            try:
-                export_output_generator = net.start(data_batch)
-                if not g.pipeline_running:
-                    return
-                for res_export in export_output_generator:
+    finished = False
+    try:
+        with progress(message=f"Processing items...", total=total) as pbar:
+            wait_timer = TinyTimer()
+            for batch_len, batch in batches:
+                global_timer.add_input_wait(wait_timer.get_sec())
+                try:
+                    if pool is None:
+                        export_output_generator = net.start(batch)
+                    else:
+                        export_output_generator = net.start_save(batch())
                     if not g.pipeline_running:
                         return
-                    logger.trace(
-                        "items processed",
-                        extra={
-                            "items_names": [
-                                res_export_item[0].get_item_name() for res_export_item in res_export
-                            ]
-                        },
+                    for res_export in export_output_generator:
+                        if not g.pipeline_running:
+                            return
+                        logger.trace(
+                            "items processed",
+                            extra={
+                                "items_names": [
+                                    res_export_item[0].get_item_name()
+                                    for res_export_item in res_export
+                                ]
+                            },
+                        )
+                        results_counter += 1
+                except Exception as e:
+                    g.disable_move = True
+                    logger.warn(
+                        f"Item was skipped because some error occurred. Error: {e}",
+                        exc_info=True,
                     )
-                    results_counter += 1
-            except Exception as e:
-                g.disable_move = True
-                logger.warn(
-                    f"Item was skipped because some error occurred. Error: {e}",
-                    exc_info=True,
-                )
-            finally:
-                pbar.update(len(data_batch))
-                g.current = pbar.n
-
-    processing_time_end = time()
-    logger.debug(
-        f"Total items processing time: {processing_time_end-processing_time_start:.10f} seconds."
-    )
-    if not g.pipeline_running:
-        return
+                finally:
+                    pbar.update(batch_len)
+                    g.current = pbar.n
+                    wait_timer = TinyTimer()
 
-    postprocessing_time_start = time()
-    net.postprocess()
-    postprocessing_time_end = time()
-    logger.debug(
-        f"Total postprocessing time: {postprocessing_time_end-postprocessing_time_start:.10f} seconds."
-    )
+        processing_time_end = time()
+        logger.debug(
+            f"Total items processing time: {processing_time_end-processing_time_start:.10f} seconds."
+        )
+        if not g.pipeline_running:
+            return
 
-    if not g.pipeline_running:
-        return
+        postprocessing_time_start = time()
+        net.postprocess()
+        postprocessing_time_end = time()
+        logger.debug(
+            f"Total postprocessing time: {postprocessing_time_end-postprocessing_time_start:.10f} seconds."
+        )
+
+        if not g.pipeline_running:
+            return
+        finished = True
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if not finished:
+            # pipeline was stopped or failed, background uploads are not waited for
+            net.cancel()
 
     logger.info(
         "Pipeline finished",
@@ -201,6 +232,9 @@ def main(
     logger.info(
         f"Total pipeline time: {total_pipeline_time_end-total_pipeline_time_start:.10f} seconds."
     )
+    g.pipeline_stats = global_timer.summary()
+    g.pipeline_stats["wall_sec"] = total_pipeline_time_end - total_pipeline_time_start
+    logger.info("Pipeline profiling summary", extra={"summary": g.pipeline_stats})
     return net
 
 
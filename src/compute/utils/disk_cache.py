@@ -0,0 +1,171 @@
+# coding: utf-8
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import src.globals as g
+from supervisely import batched, logger
+from supervisely.api.image_api import ImageInfo
+from supervisely.imaging import image as sly_image
+from supervisely.io.fs import mkdir, silent_remove
+
+from src.compute.utils.stat_timer import TinyTimer, global_timer
+
+
+class DiskCache:
+    """
+    Content-addressed files cache with a total size limit.
+    Least recently used entries are evicted when the limit is exceeded.
+    Entries are written atomically, so cache may be shared between runs of the app.
+    """
+
+    def __init__(self, root: str, max_size: int):
+        self.root = root
+        self.max_size = max_size
+        self._lock = Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # path -> size, oldest first
+        self._size = 0
+        if self.enabled:
+            mkdir(self.root)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _load_index(self) -> None:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith(".tmp"):
+                    silent_remove(path)
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._entries[path] = size
+            self._size += size
+        self._evict()
+
+    def _get_path(self, namespace: str, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, namespace, digest[:2], digest)
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        path = self._get_path(namespace, key)
+        with self._lock:
+            if path not in self._entries:
+                return None
+            self._entries.move_to_end(path)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mtime is used to restore LRU order on the next start
+            return data
+        except OSError:
+            with self._lock:
+                self._size -= self._entries.pop(path, 0)
+            return None
+
+    def put(self, namespace: str, key: str, data: bytes) -> None:
+        if not self.enabled or len(data) > self.max_size:
+            return
+        path = self._get_path(namespace, key)
+        tmp_path = f"{path}.{os.getpid()}.{id(data)}.tmp"
+        try:
+            mkdir(os.path.dirname(path))
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warn(f"Failed to write cache entry: {e}")
+            silent_remove(tmp_path)
+            return
+        with self._lock:
+            self._size -= self._entries.pop(path, 0)
+            self._entries[path] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_size and len(self._entries) > 0:
+            path, size = self._entries.popitem(last=False)
+            self._size -= size
+            silent_remove(path)
+
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_cache() -> DiskCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(g.CACHE_DIR, int(g.CACHE_MAX_SIZE_GB * 1024**3))
+        return _cache
+
+
+def _download_image_bytes(img_info: ImageInfo) -> bytes:
+    tm = TinyTimer()
+    img_bytes = g.api.image.download_bytes(img_info.id)
+    global_timer.add_io("image_download", tm.get_sec(), len(img_bytes), 1)
+    return img_bytes
+
+
+def download_image_bytes(img_info: ImageInfo) -> bytes:
+    cache = get_cache()
+    if img_info.hash is None:
+        return _download_image_bytes(img_info)
+    tm = TinyTimer()
+    img_bytes = cache.get("images", img_info.hash)
+    if img_bytes is None:
+        img_bytes = _download_image_bytes(img_info)
+        cache.put("images", img_info.hash, img_bytes)
+    else:
+        global_timer.add_io("image_cache_read", tm.get_sec(), len(img_bytes), 1)
+    return img_bytes
+
+
+def download_image_np(img_info: ImageInfo) -> np.ndarray:
+    img_bytes = download_image_bytes(img_info)
+    tm = TinyTimer()
+    img = sly_image.read_bytes(img_bytes)
+    global_timer.add_io("image_decoding", tm.get_sec(), len(img_bytes), 1)
+    return img
+
+
+def download_image_path(img_info: ImageInfo, path: str) -> None:
+    img_bytes = download_image_bytes(img_info)
+    mkdir(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(img_bytes)
+
+
+def download_ann_jsons(
+    dataset_id: int, img_infos: List[ImageInfo], batch_size: int = 50
+) -> List[dict]:
+    """
+    Returns annotation jsons in the order of img_infos. Annotations are not cached: labels may
+    be edited without changing the image updated_at, so there is no cheap key to validate them.
+    """
+    anns: Dict[int, dict] = {}
+    for batch in batched(img_infos, batch_size):
+        tm = TinyTimer()
+        ann_infos = g.api.annotation.download_batch(dataset_id, [info.id for info in batch])
+        download_sec = tm.get_sec()
+        batch_bytes = 0
+        for ann_info in ann_infos:
+            anns[ann_info.image_id] = ann_info.annotation
+            batch_bytes += len(json.dumps(ann_info.annotation))
+        global_timer.add_io("annotation_download", download_sec, batch_bytes, len(batch))
+    return [anns[img_info.id] for img_info in img_infos]
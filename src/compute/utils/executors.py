@@ -0,0 +1,69 @@
+# coding: utf-8
+
+import multiprocessing
+import random
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+from typing import List
+
+import numpy as np
+
+import src.globals as g
+
+EXECUTOR_TYPES = ["thread", "process"]
+
+_executors = {}
+_executors_lock = Lock()
+
+
+def get_executor(executor_type: str) -> Executor:
+    if executor_type not in EXECUTOR_TYPES:
+        raise ValueError(
+            f"Unknown executor type: {executor_type}. Available: {', '.join(EXECUTOR_TYPES)}"
+        )
+    with _executors_lock:
+        if executor_type not in _executors:
+            if executor_type == "thread":
+                _executors[executor_type] = ThreadPoolExecutor(max_workers=g.LAYER_WORKERS)
+            else:
+                # forking the app server would copy its threads and open connections
+                _executors[executor_type] = ProcessPoolExecutor(
+                    max_workers=g.LAYER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+        return _executors[executor_type]
+
+
+def _seed_all(seed: int) -> None:
+    np.random.seed(seed)
+    random.seed(seed)
+    try:
+        import imgaug
+
+        imgaug.random.seed(seed)
+    except ImportError:
+        pass
+
+
+def _process_item(layer, data_el, seed=None) -> list:
+    if seed is not None:
+        _seed_all(seed)
+    return list(layer.process(data_el))
+
+
+def process_items_parallel(layer, data_batch: list) -> List[list]:
+    """
+    Runs layer.process() for every item of the batch on the executor chosen by
+    layer.executor_type. Returns outputs of every item in the input order.
+    Items sent to worker processes get a seed drawn from the main process random state,
+    so results are reproducible when the main process is seeded.
+    """
+    executor = get_executor(layer.executor_type)
+    if layer.executor_type == "process":
+        seeds = [int(seed) for seed in np.random.randint(0, 2**31 - 1, size=len(data_batch))]
+    else:
+        seeds = [None] * len(data_batch)
+    futures = [
+        executor.submit(_process_item, layer, data_el, seed)
+        for data_el, seed in zip(data_batch, seeds)
+    ]
+    return [future.result() for future in futures]
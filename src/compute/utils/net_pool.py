@@ -0,0 +1,205 @@
+# coding: utf-8
+
+import copy
+import multiprocessing
+import os
+import shutil
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from supervisely import logger
+
+from src.compute.utils.executors import _seed_all
+from src.compute.utils.stat_timer import global_timer
+
+SHM_DIR = "/dev/shm"
+# free space left in SHM_DIR for other processes and for batches shared at the same time
+SHM_RESERVE_BYTES = 256 * 1024 * 1024
+
+
+def fits_shared_memory(nbytes: int) -> bool:
+    # writing past the free space of /dev/shm kills the process with SIGBUS instead of raising
+    if not os.path.isdir(SHM_DIR):
+        return True
+    return shutil.disk_usage(SHM_DIR).free >= nbytes + SHM_RESERVE_BYTES
+
+
+class SharedArray:
+    """
+    Picklable handle of a numpy array copied to shared memory. Only the handle is pickled
+    when items are sent between processes, the receiver copies the array and frees the memory.
+    """
+
+    def __init__(self, arr: np.ndarray):
+        shm = SharedMemory(create=True, size=max(1, arr.nbytes))
+        np.copyto(np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf), arr)
+        self.name = shm.name
+        self.shape = arr.shape
+        self.dtype = arr.dtype
+        shm.close()
+
+    def read(self) -> np.ndarray:
+        shm = SharedMemory(name=self.name)
+        try:
+            arr = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+        return arr
+
+    def release(self) -> None:
+        try:
+            shm = SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+
+def share_batch(data_batch: list) -> list:
+    # replaces loaded images with shared memory handles. Lazy loaders and images that do not fit
+    # in the shared memory are pickled as is
+    shared_batch = []
+    for item_desc, ann in data_batch:
+        if isinstance(item_desc._item_data, np.ndarray) and fits_shared_memory(
+            item_desc._item_data.nbytes
+        ):
+            item_desc = copy.copy(item_desc)
+            item_desc._item_data = SharedArray(item_desc._item_data)
+        shared_batch.append((item_desc, ann))
+    return shared_batch
+
+
+def unshare_batch(data_batch: list) -> list:
+    for item_desc, _ in data_batch:
+        if isinstance(item_desc._item_data, SharedArray):
+            item_desc._item_data = item_desc._item_data.read()
+    return data_batch
+
+
+def release_batch(data_batch: list) -> None:
+    for item_desc, _ in data_batch:
+        if isinstance(item_desc._item_data, SharedArray):
+            item_desc._item_data.release()
+
+
+_worker_net = None
+
+
+def _init_worker(graph: list, output_folder: str, modality: str) -> None:
+    global _worker_net
+    from src.compute.Net import Net
+
+    net = Net(graph, output_folder, modality)
+    net.in_worker = True
+    net.compile_routing()
+    net.calc_metas()
+    for layer in net.layers:
+        # save layers run in the main process only
+        if layer.type != "save":
+            layer.preprocess()
+    _worker_net = net
+
+
+def _process_batch(data_batch: list, seed: int) -> Tuple[List[Tuple[int, list]], dict]:
+    try:
+        _seed_all(seed)
+        save_inputs = _worker_net.process_until_save(unshare_batch(data_batch))
+        results = [(indx, share_batch(batch)) for indx, batch in save_inputs]
+        # timings of the worker are merged into the run summary of the main process
+        return results, global_timer.pop_records()
+    except Exception as e:
+        # exceptions of the layers may be not picklable
+        logger.warn(f"Worker failed to process batch: {e}", exc_info=True)
+        raise RuntimeError(f"{type(e).__name__}: {e}\n{traceback.format_exc()}") from None
+
+
+class NetWorkerPool:
+    """
+    Runs processing layers of the graph in worker processes. Every worker builds its own Net
+    from the graph, input batches are sent to the workers and the batches reaching save layers
+    are returned to the main process. Images are passed through shared memory while it has
+    free space (see g.NET_WORKERS), otherwise they are pickled.
+    """
+
+    def __init__(self, graph: list, output_folder: str, modality: str, workers: int):
+        self.workers = max(1, workers)
+        # workers are started after the tracker, so shared memory created by a worker
+        # and unlinked by the main process is registered in the same tracker
+        resource_tracker.ensure_running()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # forking would copy the app server's threads, prefetch threads and open connections,
+            # locks held by them stay locked in the workers
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(graph, output_folder, modality),
+        )
+        self._pending = {}  # future -> shared input batch
+
+    def _submit(self, data_batch: list) -> Future:
+        shared_batch = share_batch(data_batch)
+        # drawn in the main process, so results do not depend on the worker the batch is sent to
+        seed = int(np.random.randint(0, 2**31 - 1))
+        future = self._executor.submit(_process_batch, shared_batch, seed)
+        self._pending[future] = shared_batch
+        return future
+
+    def _get_result(self, future: Future) -> List[Tuple[int, list]]:
+        self._pending.pop(future, None)
+        results, timer_records = future.result()
+        global_timer.merge_records(timer_records)
+        return [(indx, unshare_batch(batch)) for indx, batch in results]
+
+    def imap(
+        self, data_batches: Iterable[list], ordered: bool = True
+    ) -> Iterator[Tuple[int, Callable[[], List[Tuple[int, list]]]]]:
+        """
+        Yields (batch size, result getter) for every input batch. The getter returns
+        (save layer index, batch) pairs and raises the error of the worker if processing failed.
+        At most 2 batches per worker are in flight. With ordered=False results are yielded
+        as soon as they are ready.
+        """
+        in_flight = deque()
+        data_batches = iter(data_batches)
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < 2 * self.workers:
+                data_batch = next(data_batches, None)
+                if data_batch is None:
+                    exhausted = True
+                    break
+                in_flight.append((len(data_batch), self._submit(data_batch)))
+            if len(in_flight) == 0:
+                return
+            if not ordered:
+                wait([future for _, future in in_flight], return_when=FIRST_COMPLETED)
+                done = next(x for x in in_flight if x[1].done())
+                in_flight.remove(done)
+            else:
+                done = in_flight.popleft()
+            batch_len, future = done
+            yield batch_len, lambda future=future: self._get_result(future)
+
+    def _release_result(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        results, _ = future.result()
+        for _, batch in results:
+            release_batch(batch)
+
+    def shutdown(self) -> None:
+        for future, shared_batch in self._pending.items():
+            if future.cancel():
+                release_batch(shared_batch)
+            else:
+                # results that will never be consumed
+                future.add_done_callback(self._release_result)
+        self._pending = {}
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,34 @@
+# coding: utf-8
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generator, Iterable, List, Tuple
+
+
+def prefetch_batches(
+    batches: Iterable[List[Any]],
+    load_fn: Callable[[Any], Any],
+    workers: int,
+    depth: int,
+) -> Generator[Tuple[List[Any], List[Any]], None, None]:
+    """
+    Applies load_fn to every element of every batch on a thread pool, keeping up to
+    `depth` batches in flight ahead of the one returned to the caller.
+    Yields (batch, results) pairs in the input order.
+    """
+    workers = max(1, workers)
+    depth = max(1, depth)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for batch in batches:
+            pending.append((batch, [executor.submit(load_fn, el) for el in batch]))
+            if len(pending) > depth:
+                batch, futures = pending.popleft()
+                yield batch, [f.result() for f in futures]
+        while len(pending) > 0:
+            batch, futures = pending.popleft()
+            yield batch, [f.result() for f in futures]
+    finally:
+        # generator may be closed early (pipeline stopped) - drop queued downloads
+        executor.shutdown(wait=False, cancel_futures=True)
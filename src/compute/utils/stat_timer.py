@@ -5,6 +5,7 @@ import os
 import time
 
 from threading import Lock
+import numpy as np
 from supervisely.sly_logger import logger
 from supervisely.io.json import dump_json_file
 
@@ -23,6 +24,8 @@ class StatTimer:
         self.logging_interval = logging_interval
         self.lock = Lock()
         self._q_dct = {}
+        self._io_dct = {}
+        self._input_wait_sec = 0.0
 
     def add_value(self, layer_info: dict, val_sec: float):
         if self.logging_interval < 1:
@@ -46,9 +49,105 @@ class StatTimer:
 
         self.lock.release()
 
+    def add_io(self, kind: str, val_sec: float, bytes_count: int = 0, items_count: int = 0):
+        # kind: "<entity>_<operation>", e.g. "image_download", "annotation_parsing"
+        if self.logging_interval < 1:
+            return
+
+        with self.lock:
+            io_stat = self._io_dct.setdefault(
+                kind, {"calls": 0, "items": 0, "bytes": 0, "time_sec": 0.0}
+            )
+            io_stat["calls"] += 1
+            io_stat["items"] += items_count
+            io_stat["bytes"] += bytes_count
+            io_stat["time_sec"] += val_sec
+
+    def add_input_wait(self, val_sec: float):
+        # time the pipeline waited for the next input batch
+        if self.logging_interval < 1:
+            return
+
+        with self.lock:
+            self._input_wait_sec += val_sec
+
+    def pop_records(self) -> dict:
+        # records made since the last call, used to send them from worker processes
+        with self.lock:
+            records = {"layers": self._q_dct, "io": self._io_dct}
+            self._q_dct = {}
+            self._io_dct = {}
+        return records
+
+    def merge_records(self, records: dict):
+        with self.lock:
+            for object_id, layer_records in records["layers"].items():
+                self._q_dct.setdefault(object_id, []).extend(layer_records)
+            for kind, io_stat in records["io"].items():
+                merged_stat = self._io_dct.setdefault(
+                    kind, {"calls": 0, "items": 0, "bytes": 0, "time_sec": 0.0}
+                )
+                for key, value in io_stat.items():
+                    merged_stat[key] += value
+
+    def summary(self) -> dict:
+        with self.lock:
+            records = {object_id: list(values) for object_id, values in self._q_dct.items()}
+            io_dct = {kind: dict(io_stat) for kind, io_stat in self._io_dct.items()}
+            input_wait_sec = self._input_wait_sec
+        for io_stat in io_dct.values():
+            time_sec = io_stat["time_sec"]
+            io_stat["bytes_per_sec"] = io_stat["bytes"] / time_sec if time_sec > 0 else None
+
+        layers = []
+        for object_id, layer_records in records.items():
+            items_in = sum(record["items_count"] for record in layer_records)
+            items_out = sum(record.get("items_out", 0) for record in layer_records)
+            total_sec = sum(record["val_sec"] for record in layer_records)
+            # latency of a batch is divided between its items
+            counts = [max(1, record["items_count"]) for record in layer_records]
+            per_item_ms = np.repeat(
+                [record["val_sec"] * 1000 / count for record, count in zip(layer_records, counts)],
+                counts,
+            )
+            p50, p95, p99 = np.percentile(per_item_ms, [50, 95, 99])
+            layers.append(
+                {
+                    "action_name": layer_records[0]["action_name"],
+                    "id": object_id,
+                    "calls": len(layer_records),
+                    "items_in": items_in,
+                    "items_out": items_out,
+                    "total_sec": total_sec,
+                    "per_item_ms": {"p50": float(p50), "p95": float(p95), "p99": float(p99)},
+                    "items_per_sec": items_in / total_sec if total_sec > 0 else None,
+                }
+            )
+        layers.sort(key=lambda layer: layer["total_sec"], reverse=True)
+
+        network_sec = sum(
+            io_stat["time_sec"]
+            for kind, io_stat in io_dct.items()
+            if kind.endswith("_download") or kind.endswith("_upload")
+        )
+        return {
+            "layers": layers,
+            "io": io_dct,
+            "compute_sec": sum(layer["total_sec"] for layer in layers),
+            "network_sec": network_sec,  # summed over worker threads, may exceed wall time
+            "input_wait_sec": input_wait_sec,
+        }
+
     def dump(self):
         dump_json_file(self._q_dct, "stat_timer.json")
-        self._q_dct = {}
+        dump_json_file(self.summary(), "stat_timer_summary.json")
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self._q_dct = {}
+            self._io_dct = {}
+            self._input_wait_sec = 0.0
 
 
 global_timer = StatTimer(int(os.getenv("STAT_TIMER_LOG_EVERY_RECORDS", "20")))
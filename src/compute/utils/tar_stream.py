@@ -0,0 +1,53 @@
+# coding: utf-8
+
+import io
+import tarfile
+import time
+from threading import Lock
+
+from supervisely.io.fs import silent_remove
+
+from src.compute.utils.os_utils import ensure_base_path
+
+
+class TarStreamWriter:
+    """
+    Writes entries sequentially into a tar archive, so project files do not have to be written
+    to a directory and archived afterwards. Entries may be added from several threads.
+    """
+
+    def __init__(self, tar_path: str):
+        self.tar_path = tar_path
+        ensure_base_path(tar_path)
+        self._file = open(tar_path, "wb")
+        self._tar = tarfile.open(fileobj=self._file, mode="w|", encoding="utf-8")
+        self._lock = Lock()
+
+    def add_bytes(self, arcname: str, data: bytes) -> None:
+        tarinfo = tarfile.TarInfo(name=arcname)
+        tarinfo.size = len(data)
+        tarinfo.mtime = int(time.time())
+        tarinfo.mode = 0o644
+        with self._lock:
+            self._tar.addfile(tarinfo, io.BytesIO(data))
+
+    def add_file(self, arcname: str, path: str) -> None:
+        with self._lock:
+            self._tar.add(path, arcname=arcname, recursive=False)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._tar is None:
+                return
+            self._tar.close()
+            self._file.close()
+            self._tar = None
+
+    def abort(self) -> None:
+        # incomplete archive is removed, so it is not taken for a result
+        with self._lock:
+            if self._tar is None:
+                return
+            self._file.close()
+            self._tar = None
+            silent_remove(self.tar_path)
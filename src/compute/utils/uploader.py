@@ -0,0 +1,73 @@
+# coding: utf-8
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Callable, List
+
+from supervisely.sly_logger import logger
+
+
+class BackgroundUploader:
+    """
+    Runs upload jobs on worker threads with at most `max_in_flight` jobs queued or running.
+    submit() blocks when the limit is reached. Errors of the jobs are collected
+    and raised by wait().
+    """
+
+    def __init__(self, workers: int, max_in_flight: int):
+        self.workers = max(1, workers)
+        self.max_in_flight = max(self.workers, max_in_flight)
+        self._executor = None
+        self._slots = BoundedSemaphore(self.max_in_flight)
+        self._lock = Lock()
+        self._futures = []
+        self._errors: List[Exception] = []
+
+    def submit(self, fn: Callable, *args, **kwargs) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._slots.acquire()
+        future = self._executor.submit(self._run, fn, *args, **kwargs)
+        with self._lock:
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(future)
+
+    def _run(self, fn: Callable, *args, **kwargs) -> None:
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logger.warn(f"Upload failed: {e}", exc_info=True)
+            with self._lock:
+                self._errors.append(e)
+        finally:
+            self._slots.release()
+
+    def cancel(self) -> None:
+        """Drops queued jobs and collected errors, running jobs are not interrupted"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        with self._lock:
+            futures, self._futures = self._futures, []
+            self._errors = []
+        for future in futures:
+            # slots of the jobs that never started
+            if future.cancelled():
+                self._slots.release()
+
+    def wait(self) -> None:
+        """Waits for all submitted jobs and raises the first collected error"""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            self._futures = []
+            errors, self._errors = self._errors, []
+        if len(errors) > 0:
+            raise RuntimeError(
+                f"{len(errors)} upload job(s) failed. First error: {errors[0]}"
+            ) from errors[0]
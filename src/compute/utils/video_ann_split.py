@@ -0,0 +1,106 @@
+# coding: utf-8
+
+from bisect import bisect_right
+from copy import deepcopy
+from typing import Dict, List, Set, Tuple
+
+from supervisely import (
+    Frame,
+    FrameCollection,
+    VideoAnnotation,
+    VideoObjectCollection,
+    VideoTagCollection,
+)
+
+
+class SegmentsIndex:
+    """
+    Contiguous [start, end) frame ranges of the video segments. Maps frames and inclusive
+    frame intervals to the segments they belong to with binary search.
+    """
+
+    def __init__(self, frame_ranges: List[Tuple[int, int]]):
+        self.frame_ranges = frame_ranges
+        self.starts = [start for start, _ in frame_ranges]
+
+    def __len__(self):
+        return len(self.frame_ranges)
+
+    def get_segment(self, frame_index: int) -> int:
+        idx = bisect_right(self.starts, frame_index) - 1
+        if idx < 0 or frame_index >= self.frame_ranges[idx][1]:
+            return None
+        return idx
+
+    def get_segments(self, first: int, last: int) -> range:
+        # segments overlapping inclusive [first, last] interval
+        lo = max(bisect_right(self.starts, first) - 1, 0)
+        if first >= self.frame_ranges[lo][1]:
+            lo += 1
+        hi = bisect_right(self.starts, last) - 1
+        return range(lo, hi + 1)
+
+
+def split_video_annotation(
+    ann: VideoAnnotation, frame_ranges: List[Tuple[int, int]]
+) -> List[VideoAnnotation]:
+    """
+    Splits annotation into annotations of contiguous [start, end) frame ranges in one pass.
+    Frames and frame range tags go to the segments they overlap with frame indexes shifted
+    to the segment start. Objects are kept in the segments their figures appear in,
+    objects without figures are kept in every segment.
+    """
+    index = SegmentsIndex(frame_ranges)
+    segments_frames: List[List[Frame]] = [[] for _ in range(len(index))]
+    segments_tags = [[] for _ in range(len(index))]
+    objects_segments: Dict[str, Set[int]] = {}  # object key -> segments with its figures
+
+    for frame in ann.frames:
+        segment_idx = index.get_segment(frame.index)
+        if segment_idx is None:
+            continue
+        start = frame_ranges[segment_idx][0]
+        new_figures = []
+        for figure in frame.figures:
+            new_figures.append(figure.clone(frame_index=frame.index - start))
+            objects_segments.setdefault(figure.video_object.key(), set()).add(segment_idx)
+        segments_frames[segment_idx].append(
+            frame.clone(index=frame.index - start, figures=new_figures)
+        )
+
+    for tag in ann.tags:
+        if tag.frame_range is None:
+            for segment_tags in segments_tags:
+                segment_tags.append(deepcopy(tag))
+            continue
+        first, last = tag.frame_range
+        for segment_idx in index.get_segments(first, last):
+            start, end = frame_ranges[segment_idx]
+            segments_tags[segment_idx].append(
+                tag.clone(
+                    frame_range=[max(first, start) - start, min(last, end - 1) - start],
+                    key=tag.key(),
+                )
+            )
+
+    segments_objects = [[] for _ in range(len(index))]
+    for obj in ann.objects:
+        segments = objects_segments.get(obj.key())
+        if segments is None:
+            segments = range(len(index))
+        for segment_idx in segments:
+            segments_objects[segment_idx].append(obj)
+
+    annotations = []
+    for (start, end), frames, tags, objects in zip(
+        frame_ranges, segments_frames, segments_tags, segments_objects
+    ):
+        annotations.append(
+            ann.clone(
+                frames_count=end - start,
+                objects=VideoObjectCollection(objects),
+                frames=FrameCollection(frames),
+                tags=VideoTagCollection(tags),
+            )
+        )
+    return annotations
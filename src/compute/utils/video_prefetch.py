@@ -0,0 +1,110 @@
+# coding: utf-8
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator, Iterable, List, Optional, Tuple
+
+import src.globals as g
+from supervisely import logger
+from supervisely.api.video.video_api import VideoInfo
+from supervisely.io.fs import mkdir, remove_dir
+
+from src.compute.utils.stat_timer import TinyTimer, global_timer
+
+
+def get_video_path(video_info: VideoInfo) -> str:
+    # videos with the same name may come from different datasets
+    return os.path.join(g.DATA_DIR, "videos", str(video_info.id), video_info.name)
+
+
+def download_video(video_info: VideoInfo) -> str:
+    video_path = get_video_path(video_info)
+    mkdir(os.path.dirname(video_path))
+    tm = TinyTimer()
+    g.api.video.download_path(video_info.id, video_path)
+    global_timer.add_io("video_download", tm.get_sec(), os.path.getsize(video_path), 1)
+    return video_path
+
+
+def remove_video(video_info: VideoInfo) -> None:
+    remove_dir(os.path.dirname(get_video_path(video_info)))
+
+
+def _get_video_size(video_info: VideoInfo) -> int:
+    try:
+        return int((video_info.file_meta or {}).get("size", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _download(video_info: VideoInfo, download_file: bool) -> Tuple[Optional[str], dict]:
+    video_path = download_video(video_info) if download_file else None
+    tm = TinyTimer()
+    ann_json = g.api.video.annotation.download(video_info.id)
+    global_timer.add_io("annotation_download", tm.get_sec(), items_count=1)
+    return video_path, ann_json
+
+
+def prefetch_videos(
+    video_infos: Iterable[VideoInfo],
+    batch_size: int,
+    download_files: bool,
+    workers: int,
+    depth: int,
+    max_bytes: int,
+) -> Generator[List[Tuple[VideoInfo, Optional[str], dict]], None, None]:
+    """
+    Downloads up to `depth` next videos and their annotations on a thread pool.
+    Batches may be smaller than batch_size when the disk budget is reached. Yields batches of (video info, video path or None, annotation json) in the input order.
+    Video files of a batch are removed when the next batch is requested, so the caller must be
+    done with them by then. Downloads are not started while the files on disk would exceed
+    max_bytes, a single video larger than the budget is downloaded alone.
+    """
+    video_infos = iter(video_infos)
+    next_info = next(video_infos, None)
+    pending = deque()
+    used_bytes = 0
+    total_bytes = 0
+    tm = TinyTimer()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        while True:
+            while next_info is not None and len(pending) < max(batch_size, depth):
+                size = _get_video_size(next_info) if download_files else 0
+                if used_bytes > 0 and used_bytes + size > max_bytes:
+                    break
+                future = executor.submit(_download, next_info, download_files)
+                pending.append((next_info, size, future))
+                used_bytes += size
+                next_info = next(video_infos, None)
+            if len(pending) == 0:
+                break
+            batch = []
+            batch_bytes = 0
+            while len(pending) > 0 and len(batch) < batch_size:
+                video_info, size, future = pending.popleft()
+                video_path, ann_json = future.result()
+                if video_path is not None:
+                    total_bytes += os.path.getsize(video_path)
+                batch.append((video_info, video_path, ann_json))
+                batch_bytes += size
+            try:
+                yield batch
+            finally:
+                # also removes files downloaded on demand by lazy item loaders
+                for video_info, _, _ in batch:
+                    remove_video(video_info)
+                used_bytes -= batch_bytes
+    finally:
+        # generator may be closed early (pipeline stopped) - drop queued downloads
+        executor.shutdown(wait=False, cancel_futures=True)
+        for video_info, _, future in pending:
+            if not future.cancel():
+                future.add_done_callback(lambda _, video_info=video_info: remove_video(video_info))
+        wall_sec = tm.get_sec()
+        if total_bytes > 0:
+            logger.info(
+                f"Videos downloaded: {total_bytes / 1024**2:.1f} MB, "
+                f"{total_bytes / 1024**2 / max(wall_sec, 1e-6):.1f} MB/s"
+            )
@@ -0,0 +1,192 @@
+# coding: utf-8
+
+import json
+import os
+import shutil
+import subprocess
+from bisect import bisect_left
+from typing import List, Tuple
+
+import numpy as np
+from moviepy.config import get_setting
+from supervisely import logger
+from supervisely.io.fs import silent_remove
+
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+
+# ffmpeg video codec options by extension of the output file, H.264 is played by browsers
+VIDEO_CODECS = {".webm": ["-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "31"]}
+DEFAULT_VIDEO_CODEC = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"]
+
+
+def _run(cmd: List[str]) -> str:
+    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if res.returncode != 0:
+        raise RuntimeError(
+            f"Command {os.path.basename(cmd[0])} failed: {res.stderr.decode(errors='ignore')[-2000:]}"
+        )
+    return res.stdout.decode(errors="ignore")
+
+
+def get_keyframes(video_path: str, frames_to_timecodes: List[float]) -> List[int]:
+    """
+    Returns sorted indexes of key frames of the first video stream. Only packet headers are read,
+    frames are not decoded.
+    """
+    out = _run(
+        [
+            FFPROBE_BINARY,
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=pts_time,flags:stream=start_time",
+            "-of",
+            "json",
+            video_path,
+        ]
+    )
+    probe = json.loads(out)
+    start_time = float(probe.get("streams", [{}])[0].get("start_time", 0) or 0)
+    keyframes = set()
+    for packet in probe.get("packets", []):
+        if "K" not in packet.get("flags", "") or packet.get("pts_time") is None:
+            continue
+        timecode = float(packet["pts_time"]) - start_time
+        idx = bisect_left(frames_to_timecodes, timecode)
+        # nearest frame, timecodes may be rounded
+        if idx > 0 and (
+            idx == len(frames_to_timecodes)
+            or timecode - frames_to_timecodes[idx - 1] < frames_to_timecodes[idx] - timecode
+        ):
+            idx -= 1
+        keyframes.add(idx)
+    return sorted(keyframes)
+
+
+def snap_to_keyframes(cuts: List[int], keyframes: List[int]) -> List[int]:
+    # moves every cut to the next key frame, cuts after the last key frame are dropped
+    snapped = []
+    for cut in cuts:
+        idx = bisect_left(keyframes, cut)
+        if idx < len(keyframes) and keyframes[idx] > 0 and keyframes[idx] not in snapped:
+            snapped.append(keyframes[idx])
+    return snapped
+
+
+def _stream_copy(video_path: str, cuts: List[int], out_pattern: str) -> None:
+    # single pass with the segment muxer, segments start with key frames at the given cuts
+    cmd = [get_setting("FFMPEG_BINARY"), "-v", "error", "-y", "-i", video_path]
+    cmd += ["-map", "0:v:0", "-map", "0:a?", "-c", "copy", "-f", "segment"]
+    cmd += ["-segment_frames", ",".join(str(cut) for cut in cuts)]
+    cmd += ["-reset_timestamps", "1", "-segment_start_number", "0", out_pattern]
+    _run(cmd)
+
+
+def _reencode(
+    video_path: str, frame_range: Tuple[int, int], frames_to_timecodes: List[float], out_path: str
+) -> None:
+    # input seeking is frame exact when re-encoding, only the GOP before the start is decoded
+    start, end = frame_range
+    cmd = [get_setting("FFMPEG_BINARY"), "-v", "error", "-y"]
+    cmd += ["-ss", str(frames_to_timecodes[start]), "-i", video_path]
+    cmd += ["-map", "0:v:0", "-map", "0:a?", "-frames:v", str(end - start)]
+    if end < len(frames_to_timecodes):
+        cmd += ["-t", str(frames_to_timecodes[end] - frames_to_timecodes[start])]
+    cmd += [out_path]
+    _run(cmd)
+
+
+class VideoEncoder:
+    """
+    Encodes RGB frames piped to ffmpeg in a single pass. Audio streams of audio_src_path
+    are stream copied to the output.
+    """
+
+    def __init__(
+        self, out_path: str, width: int, height: int, frame_rate: float, audio_src_path: str
+    ):
+        ext = os.path.splitext(out_path)[1].lower()
+        cmd = [get_setting("FFMPEG_BINARY"), "-v", "error", "-y"]
+        cmd += ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}"]
+        cmd += ["-r", str(frame_rate), "-i", "-", "-i", audio_src_path]
+        cmd += ["-map", "0:v:0", "-map", "1:a?", "-c:a", "copy"]
+        cmd += VIDEO_CODECS.get(ext, DEFAULT_VIDEO_CODEC)
+        # browsers play 4:2:0 only, it requires even frame size
+        if width % 2 == 0 and height % 2 == 0:
+            cmd += ["-pix_fmt", "yuv420p"]
+        if ext in [".mp4", ".mov"]:
+            cmd += ["-movflags", "+faststart"]
+        cmd += [out_path]
+        self._cmd = cmd
+        self._proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+
+    def write(self, frame: np.ndarray) -> None:
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        except BrokenPipeError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        self._proc.stdin.close()
+        stderr = self._proc.stderr.read()
+        self._proc.stderr.close()
+        if self._proc.wait() != 0:
+            raise RuntimeError(
+                f"Command {os.path.basename(self._cmd[0])} failed: {stderr.decode(errors='ignore')[-2000:]}"
+            )
+
+    def abort(self) -> None:
+        self._proc.kill()
+        self._proc.wait()
+        self._proc.stdin.close()
+        self._proc.stderr.close()
+
+
+def split_video(
+    video_path: str,
+    frame_ranges: List[Tuple[int, int]],
+    out_paths: List[str],
+    frames_to_timecodes: List[float],
+    keyframes: List[int],
+    tmp_dir: str,
+) -> None:
+    """
+    Writes [start, end) frame ranges of the video to out_paths. Ranges must cover the video
+    without gaps. Segments starting and ending at key frames are stream copied in one pass,
+    the others are re-encoded.
+    """
+    keyframes = set(keyframes)
+    frames_count = len(frames_to_timecodes)
+    aligned_cuts = [start for start, _ in frame_ranges[1:] if start in keyframes]
+    is_aligned = [
+        start in keyframes and (end >= frames_count or end in keyframes)
+        for start, end in frame_ranges
+    ]
+    if any(is_aligned):
+        ext = os.path.splitext(out_paths[0])[1]
+        out_pattern = os.path.join(tmp_dir, f"segment_%d{ext}")
+        os.makedirs(tmp_dir, exist_ok=True)
+        _stream_copy(video_path, aligned_cuts, out_pattern)
+        # segment muxer pieces are numbered by the aligned cuts
+        piece_starts = [0] + aligned_cuts
+        for piece_idx, piece_start in enumerate(piece_starts):
+            piece_path = out_pattern % piece_idx
+            range_idx = next(
+                (i for i, (start, _) in enumerate(frame_ranges) if start == piece_start), None
+            )
+            if range_idx is not None and is_aligned[range_idx]:
+                os.replace(piece_path, out_paths[range_idx])
+            else:
+                silent_remove(piece_path)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    for frame_range, out_path, aligned in zip(frame_ranges, out_paths, is_aligned):
+        if not aligned:
+            _reencode(video_path, frame_range, frames_to_timecodes, out_path)
+    logger.debug(
+        f"Video split into {len(frame_ranges)} segments, {sum(is_aligned)} of them stream copied"
+    )
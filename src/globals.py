@@ -106,6 +106,42 @@ if MODALITY_TYPE == "images":
 else:
     BATCH_SIZE = 1
 
+# input items are downloaded on a thread pool, up to PREFETCH_BATCHES batches ahead of processing
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+PREFETCH_BATCHES = int(os.getenv("PREFETCH_BATCHES", "2"))
+
+# layers with executor_type process items of a batch on LAYER_WORKERS threads or processes,
+# 1 disables the executors
+LAYER_WORKERS = int(os.getenv("LAYER_WORKERS", "1"))
+
+# save layers upload batches in background, at most UPLOAD_MAX_IN_FLIGHT batches are queued
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_MAX_IN_FLIGHT = int(os.getenv("UPLOAD_MAX_IN_FLIGHT", "8"))
+
+# downloaded images are kept between runs by hash, 0 disables the cache
+CACHE_DIR = os.getenv("CACHE_DIR", "sly_task_data/cache")
+CACHE_MAX_SIZE_GB = float(os.getenv("CACHE_MAX_SIZE_GB", "20"))
+
+# up to VIDEO_PREFETCH next videos are downloaded to DATA_DIR while their total size fits
+# VIDEO_DISK_BUDGET_GB, files are removed after the videos are saved
+VIDEO_PREFETCH = int(os.getenv("VIDEO_PREFETCH", "4"))
+VIDEO_DISK_BUDGET_GB = float(os.getenv("VIDEO_DISK_BUDGET_GB", "20"))
+
+# image layers are applied to video frames read in chunks of VIDEO_FRAMES_CHUNK frames
+VIDEO_FRAMES_CHUNK = int(os.getenv("VIDEO_FRAMES_CHUNK", "32"))
+
+# export archive layers write projects directly to .tar files in RESULTS_DIR
+STREAM_ARCHIVES = bool(strtobool(os.getenv("STREAM_ARCHIVES", "false")))
+
+# "parallel" runs processing layers in NET_WORKERS processes, input and save layers stay in the
+# main process. With NET_WORKERS_ORDERED=false batches are saved in the order they are processed
+# images are sent to the workers through /dev/shm, which is 64 MB in docker containers by default.
+# Run the container with a larger --shm-size (e.g. --shm-size=8g), images that do not fit in it
+# are pickled, which is slower
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "sequential")
+NET_WORKERS = int(os.getenv("NET_WORKERS", str(os.cpu_count() or 1)))
+NET_WORKERS_ORDERED = bool(strtobool(os.getenv("NET_WORKERS_ORDERED", "true")))
+
 current_srcs: dict = {}
 
 cache = {
@@ -116,6 +152,7 @@ cache = {
     "dataset_id": {},
     "dataset_info": {},
     "all_datasets": {},
+    "ds_parents": {},
     "last_search": "",
 }
 
@@ -199,3 +236,4 @@ disable_move = False
 
 current = 0
 total = 0
+pipeline_stats = None  # profiling summary of the last finished run
@@ -6,6 +6,7 @@ from fastapi import Request, Response
 import src.globals as g
 import src.utils as u
 from src.compute.dtl_utils.item_descriptor import ImageDescriptor
+from src.compute.utils.stat_timer import global_timer
 from src.preconfigured.templates import templates
 from src.preconfigured.utils import load_template
 from src.ui.dtl.actions.input.filtered_project.filtered_project import (
@@ -239,12 +240,14 @@ def run_pipeline_from_api(response: Response, request: Request):
 @server.post("/get_pipeline_status")
 def run_pipeline_from_api(response: Response, request: Request):
     try:
-        # @TODO: improve stats
         if not g.pipeline_running:
-            return {"result": "pipeline is not running"}
+            return {"result": "pipeline is not running", "stats": g.pipeline_stats}
 
         current = g.current
         total = g.total
-        return {"result": f"Pipeline status is {current}/{total}"}
+        return {
+            "result": f"Pipeline status is {current}/{total}",
+            "stats": global_timer.summary(),
+        }
     except Exception as e:
         raise e
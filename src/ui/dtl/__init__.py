@@ -350,6 +350,12 @@ image_actions_legacy_dict = {
 
 video_actions_list = {
     SOURCE_ACTIONS: [VideosProjectAction.name],
+    PIXEL_LEVEL_TRANSFORMS: [
+        AnonymizeAction.name,
+        BlurAction.name,
+        ContrastBrightnessAction.name,
+    ],
+    SPATIAL_LEVEL_TRANSFORMS: [ResizeAction.name],
     ANNOTATION_TRANSFORMS: [
         BackgroundAction.name,
         BBoxAction.name,
@@ -374,6 +380,12 @@ video_actions_list = {
 video_actions_dict = {
     # Data layers
     VideosProjectAction.name: VideosProjectAction,
+    # Pixel-level transforms layers, applied to every frame
+    AnonymizeAction.name: AnonymizeAction,
+    BlurAction.name: BlurAction,
+    ContrastBrightnessAction.name: ContrastBrightnessAction,
+    # Spatial-level transforms layers
+    ResizeAction.name: ResizeAction,
     # Annotation layers
     BackgroundAction.name: BackgroundAction,
     BBoxAction.name: BBoxAction,
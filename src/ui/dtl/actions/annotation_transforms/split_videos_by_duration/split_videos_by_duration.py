@@ -36,8 +36,24 @@ class SplitVideoByDuration(VideoAction):
             content=split_step_input,
         )
 
+        cut_mode_selector = Select(
+            [
+                Select.Item(value="exact", label="Exact"),
+                Select.Item(value="keyframes", label="Keyframes"),
+            ],
+            size="small",
+        )
+        cut_mode_field = Field(
+            title="Cut mode",
+            description=(
+                "Exact: videos are cut at the given frames, segments not starting at key frames are re-encoded. "
+                "Keyframes: cuts are moved to the next key frames and all segments are copied without re-encoding."
+            ),
+            content=cut_mode_selector,
+        )
+
         settings_container = Container(
-            widgets=[settings_edit_text, duration_unit_selector, duration_settings],
+            widgets=[settings_edit_text, duration_unit_selector, duration_settings, cut_mode_field],
         )
         saved_settings = {}
 
@@ -49,11 +65,16 @@ class SplitVideoByDuration(VideoAction):
         def duration_unit_selector_cb(value):
             _save_settings()
 
+        @cut_mode_selector.value_changed
+        def cut_mode_selector_cb(value):
+            _save_settings()
+
         def _save_settings():
             nonlocal saved_settings
             settings = {
                 "duration_unit": duration_unit_selector.get_value(),
                 "split_step": split_step_input.get_value(),
+                "cut_mode": cut_mode_selector.get_value(),
             }
             saved_settings = settings
 
@@ -66,6 +87,7 @@ class SplitVideoByDuration(VideoAction):
             duration_unit_selector.set_value(duration_unit)
             split_step = settings.get("split_step", 500)
             split_step_input.value = split_step
+            cut_mode_selector.set_value(settings.get("cut_mode", "exact"))
             _save_settings()
 
         def create_options(src: list, dst: list, settings: dict) -> dict:
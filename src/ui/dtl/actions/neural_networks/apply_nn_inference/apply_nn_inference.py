@@ -67,6 +67,7 @@ class ApplyNNInferenceAction(ApplyNNAction):
         _prev_connections = []
         _deploy_node_is_connected = False
         _model_from_apply_node = False  # when connect button is pressed
+        _pending_roi_classes = []  # roi classes from json until input meta is known
 
         (
             connect_nn_text,
@@ -102,6 +103,20 @@ class ApplyNNInferenceAction(ApplyNNAction):
             inf_settings_edit_container,
             inf_settings_widgets_container,
             inf_settings_preview_container,
+            roi_classes_list,
+            roi_pad_top,
+            roi_pad_left,
+            roi_pad_right,
+            roi_pad_bottom,
+            roi_pad_unit_selector,
+            roi_settings_container,
+            sw_width_input,
+            sw_height_input,
+            sw_overlap_x_input,
+            sw_overlap_y_input,
+            sw_nms_iou_input,
+            sw_masks_merge_selector,
+            sw_settings_container,
         ) = create_inference_settings_widgets()
 
         (
@@ -315,12 +330,16 @@ class ApplyNNInferenceAction(ApplyNNAction):
             )
 
         def meta_change_cb(project_meta: ProjectMeta):
-            nonlocal _current_meta
+            nonlocal _current_meta, _pending_roi_classes
             if project_meta is None:
                 return
             if project_meta == _current_meta:
                 return
             _current_meta = project_meta
+            roi_classes_list.set(_current_meta.obj_classes)
+            if len(_pending_roi_classes) > 0:
+                roi_classes_list.select(_pending_roi_classes)
+                _pending_roi_classes = []
 
         def data_changed_cb(**kwargs):
             nonlocal _deploy_node_is_connected, _model_from_apply_node
@@ -489,10 +508,30 @@ class ApplyNNInferenceAction(ApplyNNAction):
                 "classes": saved_classes_settings,
                 "tags": saved_tags_settings,
             }
+            if apply_method == "roi":
+                settings["roi"] = get_roi_settings(
+                    roi_classes_list,
+                    roi_pad_top,
+                    roi_pad_left,
+                    roi_pad_right,
+                    roi_pad_bottom,
+                    roi_pad_unit_selector,
+                )
+                if len(_pending_roi_classes) > 0:
+                    settings["roi"]["classes"] = _pending_roi_classes
+            elif apply_method == "sliding_window":
+                settings["sliding_window"] = get_sliding_window_settings(
+                    sw_width_input,
+                    sw_height_input,
+                    sw_overlap_x_input,
+                    sw_overlap_y_input,
+                    sw_nms_iou_input,
+                    sw_masks_merge_selector,
+                )
             return settings
 
         def _set_settings_from_json(settings: dict):
-            nonlocal _model_meta, _model_info, _model_settings, _session_id
+            nonlocal _model_meta, _model_info, _model_settings, _session_id, _pending_roi_classes
             connect_notification.loading = True
             _session_id = set_deployed_model_from_json(settings, connect_nn_model_selector)
             if _session_id is None:
@@ -559,6 +598,31 @@ class ApplyNNInferenceAction(ApplyNNAction):
             set_model_conflict_from_json(settings, resolve_conflict_method_selector)
             _model_settings = set_model_settings_from_json(settings, inf_settings_editor)
             set_model_apply_method_from_json(settings, apply_nn_methods_selector)
+            _pending_roi_classes = set_roi_settings_from_json(
+                settings,
+                roi_classes_list,
+                roi_pad_top,
+                roi_pad_left,
+                roi_pad_right,
+                roi_pad_bottom,
+                roi_pad_unit_selector,
+            )
+            if len(roi_classes_list.get_all_classes()) > 0:
+                _pending_roi_classes = []
+            set_sliding_window_settings_from_json(
+                settings,
+                sw_width_input,
+                sw_height_input,
+                sw_overlap_x_input,
+                sw_overlap_y_input,
+                sw_nms_iou_input,
+                sw_masks_merge_selector,
+            )
+            show_apply_method_settings(
+                apply_nn_methods_selector.get_value(),
+                roi_settings_container,
+                sw_settings_container,
+            )
             set_model_settings_preview(
                 model_suffix_input,
                 always_add_suffix_checkbox,
@@ -622,6 +686,10 @@ class ApplyNNInferenceAction(ApplyNNAction):
             )
             g.updater("metas")
 
+        @apply_nn_methods_selector.value_changed
+        def apply_nn_method_changed(value):
+            show_apply_method_settings(value, roi_settings_container, sw_settings_container)
+
         @inf_settings_save_btn.click
         def inf_settings_save_btn_cb():
             nonlocal _session_id, _model_settings
@@ -653,6 +721,11 @@ class ApplyNNInferenceAction(ApplyNNAction):
                 inf_settings_editor,
                 connect_nn_model_preview,
             )
+            show_apply_method_settings(
+                apply_nn_methods_selector.get_value(),
+                roi_settings_container,
+                sw_settings_container,
+            )
             g.updater("metas")
 
         def create_options(src: list, dst: list, settings: dict) -> dict:
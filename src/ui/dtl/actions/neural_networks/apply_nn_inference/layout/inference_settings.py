@@ -7,8 +7,11 @@ from supervisely.app.widgets import (
     Editor,
     Select,
     Input,
+    InputNumber,
     Checkbox,
+    Grid,
 )
+from src.ui.widgets import ClassesList
 from src.ui.dtl.utils import (
     get_set_settings_button_style,
     get_set_settings_container,
@@ -59,8 +62,8 @@ def create_inference_settings_widgets():
 
     apply_nn_selector_methods = [
         Select.Item("image", "Full Image"),
-        Select.Item("roi", "ROI defined by object BBox (Coming Soon)", disabled=True),
-        Select.Item("sliding_window", "Sliding Window (Coming Soon)", disabled=True),
+        Select.Item("roi", "ROI defined by object BBox"),
+        Select.Item("sliding_window", "Sliding Window"),
     ]
 
     apply_nn_method_text = Text("Apply Method", font_size=get_text_font_size())
@@ -71,6 +74,99 @@ def create_inference_settings_widgets():
         content=apply_nn_methods_selector,
     )
 
+    # ROI settings
+    roi_classes_list = ClassesList(multiple=True)
+    roi_classes_field = Field(
+        title="ROI Classes",
+        description="Model will be applied to the bounding boxes of objects of selected classes",
+        content=roi_classes_list,
+    )
+
+    roi_pad_top = InputNumber(min=0, value=0)
+    roi_pad_left = InputNumber(min=0, value=0)
+    roi_pad_right = InputNumber(min=0, value=0)
+    roi_pad_bottom = InputNumber(min=0, value=0)
+    roi_pad_unit_selector = Select(
+        items=[
+            Select.Item("px", "pixels"),
+            Select.Item("%", "percents"),
+        ],
+        size="small",
+    )
+    roi_pad_field = Field(
+        title="ROI Padding",
+        description="Padding around object bounding box in pixels or percents of its size",
+        content=Container(
+            widgets=[
+                roi_pad_unit_selector,
+                Grid(
+                    widgets=[
+                        Field(title="Top", content=roi_pad_top),
+                        Field(title="Left", content=roi_pad_left),
+                        Field(title="Right", content=roi_pad_right),
+                        Field(title="Bottom", content=roi_pad_bottom),
+                    ],
+                    columns=2,
+                ),
+            ]
+        ),
+    )
+    roi_settings_container = Container(widgets=[roi_classes_field, roi_pad_field])
+    roi_settings_container.hide()
+
+    # Sliding window settings
+    sw_width_input = InputNumber(value=128, min=1, step=1, controls=True)
+    sw_height_input = InputNumber(value=128, min=1, step=1, controls=True)
+    sw_window_field = Field(
+        title="Window",
+        description="Width and height of the sliding window in pixels",
+        content=Grid(
+            widgets=[
+                Field(title="Width", content=sw_width_input),
+                Field(title="Height", content=sw_height_input),
+            ],
+            columns=2,
+        ),
+    )
+
+    sw_overlap_x_input = InputNumber(value=32, min=0, step=1, controls=True)
+    sw_overlap_y_input = InputNumber(value=32, min=0, step=1, controls=True)
+    sw_overlap_field = Field(
+        title="Min Overlap",
+        description="Minimum overlap of neighbouring windows in pixels",
+        content=Grid(
+            widgets=[
+                Field(title="X", content=sw_overlap_x_input),
+                Field(title="Y", content=sw_overlap_y_input),
+            ],
+            columns=2,
+        ),
+    )
+
+    sw_nms_iou_input = InputNumber(value=0.5, min=0, max=1, step=0.05, precision=2)
+    sw_nms_iou_field = Field(
+        title="NMS IoU threshold",
+        description="Overlapping predictions of the same class with higher IoU are merged",
+        content=sw_nms_iou_input,
+    )
+
+    sw_masks_merge_selector = Select(
+        items=[
+            Select.Item("or", "Union"),
+            Select.Item("vote", "Vote"),
+        ],
+        size="small",
+    )
+    sw_masks_merge_field = Field(
+        title="Masks merge",
+        description="How to merge masks of the same class from overlapping windows",
+        content=sw_masks_merge_selector,
+    )
+    sw_settings_container = Container(
+        widgets=[sw_window_field, sw_overlap_field, sw_nms_iou_field, sw_masks_merge_field]
+    )
+    sw_settings_container.hide()
+
     inf_settings_widgets_container = Container(
         widgets=[
             model_suffix_field,
@@ -78,6 +174,8 @@ def create_inference_settings_widgets():
             resolve_conflict_method_field,
             inf_settings_editor_field,
             apply_nn_methods_field,
+            roi_settings_container,
+            sw_settings_container,
             Flexbox(
                 widgets=[
                     inf_settings_save_btn,
@@ -146,4 +244,18 @@ def create_inference_settings_widgets():
         inf_settings_edit_container,
         inf_settings_widgets_container,
         inf_settings_preview_container,
+        roi_classes_list,
+        roi_pad_top,
+        roi_pad_left,
+        roi_pad_right,
+        roi_pad_bottom,
+        roi_pad_unit_selector,
+        roi_settings_container,
+        sw_width_input,
+        sw_height_input,
+        sw_overlap_x_input,
+        sw_overlap_y_input,
+        sw_nms_iou_input,
+        sw_masks_merge_selector,
+        sw_settings_container,
     )
@@ -6,6 +6,7 @@ from supervisely.app.widgets import (
     Text,
     Select,
     Input,
+    InputNumber,
     Checkbox,
     Editor,
     ModelInfo,
@@ -246,10 +247,121 @@ def set_model_settings_from_json(settings: dict, inf_settings_editor: Editor) ->
 
 
 def set_model_apply_method_from_json(settings: dict, apply_nn_methods_selector: Select) -> None:
-    apply_method = settings.get("type", "image")
+    apply_method = settings.get("apply_method", "image")
     apply_nn_methods_selector.set_value(apply_method)
 
 
+def show_apply_method_settings(
+    apply_method: str,
+    roi_settings_container: Container,
+    sw_settings_container: Container,
+) -> None:
+    roi_settings_container.hide()
+    sw_settings_container.hide()
+    if apply_method == "roi":
+        roi_settings_container.show()
+    elif apply_method == "sliding_window":
+        sw_settings_container.show()
+
+
+def get_roi_settings(
+    roi_classes_list: ClassesList,
+    roi_pad_top: InputNumber,
+    roi_pad_left: InputNumber,
+    roi_pad_right: InputNumber,
+    roi_pad_bottom: InputNumber,
+    roi_pad_unit_selector: Select,
+) -> dict:
+    unit = roi_pad_unit_selector.get_value()
+    return {
+        "classes": [obj_class.name for obj_class in roi_classes_list.get_selected_classes()],
+        "pad": {
+            "sides": {
+                "top": f"{roi_pad_top.get_value()}{unit}",
+                "left": f"{roi_pad_left.get_value()}{unit}",
+                "right": f"{roi_pad_right.get_value()}{unit}",
+                "bottom": f"{roi_pad_bottom.get_value()}{unit}",
+            }
+        },
+    }
+
+
+def get_sliding_window_settings(
+    sw_width_input: InputNumber,
+    sw_height_input: InputNumber,
+    sw_overlap_x_input: InputNumber,
+    sw_overlap_y_input: InputNumber,
+    sw_nms_iou_input: InputNumber,
+    sw_masks_merge_selector: Select,
+) -> dict:
+    return {
+        "window": {
+            "width": sw_width_input.get_value(),
+            "height": sw_height_input.get_value(),
+        },
+        "min_overlap": {
+            "x": sw_overlap_x_input.get_value(),
+            "y": sw_overlap_y_input.get_value(),
+        },
+        "nms_iou_threshold": sw_nms_iou_input.get_value(),
+        "masks_merge": sw_masks_merge_selector.get_value(),
+    }
+
+
+def set_roi_settings_from_json(
+    settings: dict,
+    roi_classes_list: ClassesList,
+    roi_pad_top: InputNumber,
+    roi_pad_left: InputNumber,
+    roi_pad_right: InputNumber,
+    roi_pad_bottom: InputNumber,
+    roi_pad_unit_selector: Select,
+) -> List[str]:
+    roi_settings = settings.get("roi")
+    if roi_settings is None:
+        return []
+    roi_classes = roi_settings.get("classes", [])
+    roi_classes_list.select(roi_classes)
+
+    sides = roi_settings.get("pad", {}).get("sides", {})
+    unit = "px"
+    for side_input, side in [
+        (roi_pad_top, "top"),
+        (roi_pad_left, "left"),
+        (roi_pad_right, "right"),
+        (roi_pad_bottom, "bottom"),
+    ]:
+        value = sides.get(side, "0px")
+        if value.endswith("%"):
+            unit = "%"
+            value = value[: -len("%")]
+        else:
+            value = value[: -len("px")]
+        side_input.value = int(float(value))
+    roi_pad_unit_selector.set_value(unit)
+    return roi_classes
+
+
+def set_sliding_window_settings_from_json(
+    settings: dict,
+    sw_width_input: InputNumber,
+    sw_height_input: InputNumber,
+    sw_overlap_x_input: InputNumber,
+    sw_overlap_y_input: InputNumber,
+    sw_nms_iou_input: InputNumber,
+    sw_masks_merge_selector: Select,
+) -> None:
+    sw_settings = settings.get("sliding_window")
+    if sw_settings is None:
+        return
+    sw_width_input.value = sw_settings["window"]["width"]
+    sw_height_input.value = sw_settings["window"]["height"]
+    sw_overlap_x_input.value = sw_settings["min_overlap"]["x"]
+    sw_overlap_y_input.value = sw_settings["min_overlap"]["y"]
+    sw_nms_iou_input.value = sw_settings.get("nms_iou_threshold", 0.5)
+    sw_masks_merge_selector.set_value(sw_settings.get("masks_merge", "or"))
+
+
 ### -----------------------------
 
 
@@ -226,4 +226,5 @@ class AnonymizeAction(PixelLevelAction):
             create_options=create_options,
             get_settings=get_settings,
             data_changed_cb=data_changed_cb,
+            need_preview=True if g.MODALITY_TYPE == "images" else False,
         )
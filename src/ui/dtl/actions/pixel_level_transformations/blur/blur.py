@@ -17,6 +17,8 @@ from src.ui.dtl import PixelLevelAction
 from src.ui.dtl.Layer import Layer
 from src.ui.dtl.utils import get_layer_docs, get_slider_style, get_text_font_size
 
+import src.globals as g
+
 
 class BlurAction(PixelLevelAction):
     name = "blur"
@@ -157,4 +159,5 @@ class BlurAction(PixelLevelAction):
             id=layer_id,
             create_options=create_options,
             get_settings=get_settings,
+            need_preview=True if g.MODALITY_TYPE == "images" else False,
         )
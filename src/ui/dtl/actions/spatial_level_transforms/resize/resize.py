@@ -7,6 +7,8 @@ from src.ui.dtl import SpatialLevelAction
 from src.ui.dtl.Layer import Layer
 from src.ui.dtl.utils import get_layer_docs, get_text_font_size
 
+import src.globals as g
+
 # DEFAULT_ASPECT_RATIO = 16 / 9
 
 
@@ -125,4 +127,5 @@ class ResizeAction(SpatialLevelAction):
             id=layer_id,
             create_options=create_options,
             get_settings=get_settings,
+            need_preview=True if g.MODALITY_TYPE == "images" else False,
         )
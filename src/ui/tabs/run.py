@@ -143,7 +143,8 @@ def _run():
         if os.path.exists(g.RESULTS_DIR):
             for pr_dir in os.listdir(g.RESULTS_DIR):
                 pr_dir = os.path.join(g.RESULTS_DIR, pr_dir)
-                if os.path.isdir(pr_dir):
+                # projects streamed by export layers are already archived
+                if os.path.isdir(pr_dir) or pr_dir.endswith(".tar"):
                     pr_dirs.append(pr_dir)
         # pr_dirs = [p for p in Path(g.RESULTS_DIR).iterdir() if p.is_dir()]
 
@@ -152,13 +153,17 @@ def _run():
             if not g.pipeline_running:
                 return
 
-            with progress(
-                message=[f'[{i+1}/{len(pr_dirs)}] Archiving result project "{pr_dir_name}"'],
-                total=1,
-            ) as pbar:
-                tar_path = str(pr_dir) + ".tar"
-                sly.fs.archive_directory(pr_dir, tar_path)
-                pbar.update(1)
+            if os.path.isdir(pr_dir):
+                with progress(
+                    message=[f'[{i+1}/{len(pr_dirs)}] Archiving result project "{pr_dir_name}"'],
+                    total=1,
+                ) as pbar:
+                    tar_path = str(pr_dir) + ".tar"
+                    sly.fs.archive_directory(pr_dir, tar_path)
+                    pbar.update(1)
+            else:
+                tar_path = pr_dir
+                pr_dir_name = pr_dir_name[: -len(".tar")]
 
             if not g.pipeline_running:
                 return
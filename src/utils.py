@@ -9,7 +9,10 @@ from tqdm import tqdm
 
 import src.globals as g
 import supervisely as sly
+from src.compute.utils.disk_cache import download_ann_jsons, download_image_path
+from src.compute.utils.stat_timer import TinyTimer, global_timer
 from supervisely import DatasetInfo, ImageInfo, KeyIdMap, ProjectMeta, logger
+from supervisely.api.video.video_api import VideoInfo
 from supervisely.io.fs import remove_dir
 
 
@@ -54,8 +57,8 @@ def download_preview_image(
     dataset_id: int, preview_img_path: str, images_ids: List[int] = None
 ) -> tuple:
     image = get_random_image(dataset_id, images_ids)
-    g.api.image.download(image.id, preview_img_path)
-    ann_json = g.api.annotation.download_json(image.id)
+    download_image_path(image, preview_img_path)
+    ann_json = download_ann_jsons(dataset_id, [image])[0]
     return image, ann_json
 
 
@@ -244,6 +247,101 @@ def get_all_datasets(project_id: int) -> List[sly.DatasetInfo]:
     return dataset_infos
 
 
+def get_ds_parents(dataset_info: sly.DatasetInfo) -> Optional[List[str]]:
+    """Returns names of the parent datasets starting from the top level, None for top level datasets"""
+    if dataset_info is None:
+        return None
+    project_id = dataset_info.project_id
+    if project_id not in g.cache["ds_parents"]:
+        g.cache["ds_parents"][project_id] = {
+            dataset.id: parents for parents, dataset in g.api.dataset.tree(project_id)
+        }
+    ds_parents = g.cache["ds_parents"][project_id].get(dataset_info.id)
+    if not ds_parents:
+        return None
+    return ds_parents
+
+
+def upload_images(
+    dataset_id: int, names: List[str], item_descs: list, anns: list
+) -> List[ImageInfo]:
+    """
+    Uploads images with annotations to the dataset. Images that were never loaded are added by id,
+    so they are neither downloaded nor uploaded again.
+    """
+    infos = [None] * len(names)
+    by_id = [
+        idx
+        for idx, item_desc in enumerate(item_descs)
+        if item_desc.info.item_info.id is not None and item_desc.is_source_item()
+    ]
+    by_np = sorted(set(range(len(names))) - set(by_id))
+    tm = TinyTimer()
+    if len(by_id) > 0:
+        uploaded = g.api.image.upload_ids(
+            dataset_id,
+            [names[idx] for idx in by_id],
+            [item_descs[idx].info.item_info.id for idx in by_id],
+        )
+        for idx, info in zip(by_id, uploaded):
+            infos[idx] = info
+    if len(by_np) > 0:
+        uploaded = g.api.image.upload_nps(
+            dataset_id,
+            [names[idx] for idx in by_np],
+            [item_descs[idx].read_image() for idx in by_np],
+        )
+        for idx, info in zip(by_np, uploaded):
+            infos[idx] = info
+    global_timer.add_io("image_upload", tm.get_sec(), items_count=len(infos))
+    tm = TinyTimer()
+    g.api.annotation.upload_anns([info.id for info in infos], anns)
+    global_timer.add_io("annotation_upload", tm.get_sec(), items_count=len(anns))
+    return infos
+
+
+def upload_videos(
+    dataset_id: int, names: List[str], item_descs: list, anns: list, project_meta: ProjectMeta
+) -> List[VideoInfo]:
+    """
+    Uploads videos with annotations to the dataset. Unmodified source videos are added by id,
+    so their files are neither downloaded nor uploaded again.
+    """
+    infos = [None] * len(names)
+    by_id = [
+        idx
+        for idx, item_desc in enumerate(item_descs)
+        if item_desc.info.item_info.id is not None and not item_desc.item_modified
+    ]
+    by_path = sorted(set(range(len(names))) - set(by_id))
+    if len(by_id) > 0:
+        uploaded = g.api.video.upload_ids(
+            dataset_id,
+            [names[idx] for idx in by_id],
+            [item_descs[idx].info.item_info.id for idx in by_id],
+            infos=[item_descs[idx].info.item_info for idx in by_id],
+        )
+        for idx, info in zip(by_id, uploaded):
+            infos[idx] = info
+    if len(by_path) > 0:
+        tm = TinyTimer()
+        paths = [item_descs[idx].item_data for idx in by_path]
+        uploaded = g.api.video.upload_paths(dataset_id, [names[idx] for idx in by_path], paths)
+        global_timer.add_io(
+            "video_upload",
+            tm.get_sec(),
+            sum(os.path.getsize(path) for path in paths),
+            len(paths),
+        )
+        for idx, info in zip(by_path, uploaded):
+            infos[idx] = info
+    for info, ann in zip(infos, anns):
+        # objects are bound to the output meta classes, as when uploading from json files
+        ann = sly.VideoAnnotation.from_json(ann.to_json(KeyIdMap()), project_meta)
+        g.api.video.annotation.append(info.id, ann)
+    return infos
+
+
 def generate_src_ds_preview(saved_src, all_ds_map):
     src_preview_text = ""
     # total_img_cnt = 0